@@ -1,9 +1,18 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, g, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import pandas as pd
 from matching import match_donor, load_data
+from inventory import InventoryStore
+from appointments import AppointmentStore, parse_bound, MAX_PAGE_SIZE
+from sharding import ShardedMatcher
+from scheduler import MatchScheduler, ResultCache
+from capture import RequestRecorder
+import atexit
+from metrics import REGISTRY, counter, gauge, histogram, StageTimer
+import profiler
 from twilio.rest import Client
+import json
 import math
 import logging
 import secrets
@@ -40,13 +49,68 @@ except Exception as e:
     logging.error(f"Failed to initialize Twilio client: {e}")
     twilio_client = None
 
+# Optional district-sharded matcher processes (MATCH_WORKERS > 0). Forked before the donor data is
+# loaded, so each worker only ever holds the shards sent to it
+MATCH_WORKERS = int(os.getenv('MATCH_WORKERS', '0'))
+matcher = ShardedMatcher(workers=MATCH_WORKERS) if MATCH_WORKERS > 0 else None
+if matcher is not None:
+    atexit.register(matcher.close)
+
+# Donor fields the routes look up by id, kept apart from the scoring frame
+DONOR_LOOKUP_COLUMNS = ['phone', 'last_donation']
+
+def load_donors(frame):
+    """Serve matching and donor lookups from a donor frame.
+
+    With sharding on, the frame goes to the matcher workers and is not kept
+    here; the parent only holds an id-indexed frame of DONOR_LOOKUP_COLUMNS,
+    with the few distinct last-donation dates stored as a category.
+    """
+    global donors, donor_index
+    donor_index = frame.drop_duplicates('id').set_index('id')[DONOR_LOOKUP_COLUMNS].astype({'last_donation': 'category'})
+    if matcher is not None:
+        matcher.load(frame)
+        donors = None
+    else:
+        donors = frame
+
+def find_donor(donor_id):
+    """Return a donor's lookup fields by id, or None."""
+    if not pd.api.types.is_scalar(donor_id):
+        return None
+    try:
+        return donor_index.loc[donor_id]
+    except (KeyError, TypeError):
+        return None
+
 # Load data
 donors, _, hospitals = load_data()
+load_donors(donors)
+HOSPITALS_FILE = 'hospitals.csv'
+inventory = InventoryStore(hospitals)
+# hospitals.csv is written off the request path; the final version is saved at exit
+inventory.start_flusher(HOSPITALS_FILE, interval=float(os.getenv('INVENTORY_FLUSH_INTERVAL', '1.0')))
+atexit.register(inventory.flush)
+
+# Admission control for /match: bounded concurrent scoring, queued by urgency
+MATCH_RADIUS_KM = 50
+scheduler = MatchScheduler(
+    max_concurrent=int(os.getenv('MATCH_MAX_CONCURRENT', str(max(MATCH_WORKERS, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv('MATCH_MAX_QUEUE', '32'))
+)
+# Requests at or below this urgency are degraded first under load
+DEGRADE_URGENCY = int(os.getenv('MATCH_DEGRADE_URGENCY', '3'))
+DEGRADED_RADIUS_KM = float(os.getenv('MATCH_DEGRADED_RADIUS_KM', '20'))
+match_cache = ResultCache(ttl=float(os.getenv('MATCH_CACHE_TTL', '120')))
 
-# Initialize appointments.csv if it doesn't exist
+# Appointments live in an indexed SQLite store. appointments.csv is only a seed: it is imported when the
+# store is empty and never written, so read appointments through the store, not the CSV
 APPOINTMENTS_FILE = 'appointments.csv'
-if not os.path.exists(APPOINTMENTS_FILE):
-    pd.DataFrame(columns=['id', 'donor_id', 'recipient_location', 'appointment_date', 'notes', 'status']).to_csv(APPOINTMENTS_FILE, index=False)
+APPOINTMENTS_DB = os.getenv('APPOINTMENTS_DB', 'appointments.db')
+appointments = AppointmentStore(APPOINTMENTS_DB)
+imported = appointments.import_csv(APPOINTMENTS_FILE)
+if imported:
+    logging.info(f"Imported {imported} appointments from {APPOINTMENTS_FILE}")
 
 # Odisha location mapping
 ODISHA_LOCATIONS = {
@@ -80,6 +144,23 @@ REGISTERED_HOSPITALS = {
     'hospital1': 'password123'  # Replace with secure storage in production
 }
 
+# Metrics exposed at /metrics
+REQUEST_SECONDS = histogram('http_request_duration_seconds', 'Request latency by route.', ['route', 'method', 'status'])
+ROUTE_STAGE_SECONDS = histogram('route_stage_duration_seconds', 'Time spent in each stage of a route.', ['route', 'stage'])
+SMS_TOTAL = counter('sms_total', 'SMS attempts by route and outcome.', ['route', 'outcome'])
+PHONE_TOKEN_LOOKUPS = counter('phone_token_lookups_total', 'Phone reveal token lookups by result.', ['result'])
+INVENTORY_VERSION = gauge('inventory_version', 'Current hospital inventory snapshot version.')
+INVENTORY_VERSION.set(inventory.snapshot().version)
+
+# Sampling profiler endpoint is opt-in
+ENABLE_PROFILER = os.getenv('ENABLE_PROFILER', 'false').lower() == 'true'
+
+# Optional traffic capture for replay.py (CAPTURE_FILE set); phones and tokens are not recorded
+CAPTURE_FILE = os.getenv('CAPTURE_FILE')
+if CAPTURE_FILE:
+    RequestRecorder(CAPTURE_FILE, max_bytes=int(os.getenv('CAPTURE_MAX_BYTES', str(50 * 1024 * 1024))),
+                    backups=int(os.getenv('CAPTURE_BACKUPS', '5'))).install(app)
+
 def mask_phone(phone):
     """Mask a phone number, showing only the last 4 digits."""
     try:
@@ -123,6 +204,20 @@ def verify_jwt(token):
     except jwt.InvalidTokenError:
         return None
 
+@app.before_request
+def start_timer():
+    """Record when the request started."""
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    """Observe request latency by route, method and status."""
+    if 'start_time' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - g.start_time, route=route, method=request.method,
+                                status=str(response.status_code))
+    return response
+
 @app.route('/')
 def index():
     """Serve the main page."""
@@ -182,27 +277,22 @@ def hospital_update():
         if blood_type not in ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']:
             return jsonify({'status': 'error', 'message': 'Invalid blood type.'}), 400
         
-        global hospitals
-        hospitals = pd.read_csv('hospitals.csv')
-        hospital_index = hospitals[(hospitals['name'] == name) & (hospitals['blood_type'] == blood_type)].index
-        
-        if not hospital_index.empty:
-            hospitals.loc[hospital_index, 'stock'] = stock
-            hospitals.loc[hospital_index, 'latitude'] = latitude
-            hospitals.loc[hospital_index, 'longitude'] = longitude
-        else:
-            new_id = hospitals['id'].max() + 1 if not hospitals.empty else 1
-            new_hospital = pd.DataFrame([{
-                'id': new_id,
-                'name': name,
-                'latitude': latitude,
-                'longitude': longitude,
-                'blood_type': blood_type,
-                'stock': stock
-            }])
-            hospitals = pd.concat([hospitals, new_hospital], ignore_index=True)
-        
-        hospitals.to_csv('hospitals.csv', index=False)
+        try:
+            stock = float(stock)
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Stock, latitude and longitude must be numbers.'}), 400
+        if not stock.is_integer() or stock < 0:
+            return jsonify({'status': 'error', 'message': 'Stock must be a non-negative integer.'}), 400
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return jsonify({'status': 'error', 'message': 'Latitude and longitude must be finite numbers.'}), 400
+        stock = int(stock)
+        
+        stages = StageTimer(ROUTE_STAGE_SECONDS, route='/hospital/update')
+        snapshot = inventory.upsert(name, blood_type, stock, latitude, longitude)
+        INVENTORY_VERSION.set(snapshot.version)
+        stages.lap('inventory_update')
         
         # Broadcast update to all connected clients
         socketio.emit('hospital_update', {
@@ -212,6 +302,7 @@ def hospital_update():
             'latitude': latitude,
             'longitude': longitude
         })
+        stages.lap('broadcast')
         
         return jsonify({'status': 'success', 'message': 'Hospital data updated.'})
     except Exception as e:
@@ -250,7 +341,34 @@ def match():
         
         logging.debug(f"Recipient data: {recipient}")
         
-        matches = match_donor(recipient, donors, hospitals)
+        # Pin one inventory version for the whole request
+        stages = StageTimer(ROUTE_STAGE_SECONDS, route='/match')
+        snapshot = inventory.snapshot()
+        # Urgency is a model feature, so cached results are only reused for the same urgency
+        cache_key = (location, recipient['blood_type'], urgency)
+        degraded = None
+        with scheduler.slot(urgency) as admission:
+            stages.lap('queue')
+            if admission.admitted:
+                max_distance = MATCH_RADIUS_KM
+                if urgency <= DEGRADE_URGENCY and admission.pressure >= 0.5:
+                    max_distance = DEGRADED_RADIUS_KM
+                    degraded = 'reduced_radius'
+                if matcher is not None:
+                    matches = matcher.match(recipient, snapshot, max_distance)
+                else:
+                    matches = match_donor(recipient, donors, snapshot, max_distance)
+                if degraded is None:
+                    match_cache.put(cache_key, matches)
+            else:
+                logging.warning(f"/match {admission.state} after {admission.wait:.2f}s (urgency {urgency}, queue {scheduler.depth()})")
+                matches = match_cache.get(cache_key)
+                if matches is None:
+                    response = jsonify({'status': 'error', 'message': 'Matching is busy, please retry shortly.'})
+                    response.headers['Retry-After'] = '5'
+                    return response, 503
+                degraded = 'cached'
+        stages.lap('match_donor')
         
         for match in matches:
             if math.isinf(match['hospital_distance']) or match['hospital_distance'] > 1000:
@@ -263,26 +381,24 @@ def match():
             }
             match['contact_token'] = token
             # Add availability status
-            donor = donors[donors['id'] == match['donor_id']].iloc[0]
-            availability = calculate_availability(donor['last_donation'])
+            availability = calculate_availability(match['last_donation'])
             match['availability_status'] = availability['status']
-            match['last_donation'] = donor['last_donation']
+        stages.lap('enrich')
         
         closest_hospital = None
         min_distance = float('inf')
-        for _, hospital in hospitals.iterrows():
+        for hospital in snapshot.records():
             hospital_loc = (hospital['latitude'], hospital['longitude'])
             recipient_loc = (recipient['latitude'], recipient['longitude'])
             distance = haversine(hospital_loc, recipient_loc)
             if distance < min_distance:
                 min_distance = distance
                 closest_hospital = hospital
+        stages.lap('closest_hospital')
         
         sms_status = "not_attempted"
         if matches and twilio_client:
-            closest_donor_id = matches[0]['donor_id']
-            donor = donors[donors['id'] == closest_donor_id].iloc[0]
-            to_phone = donor['phone']
+            to_phone = matches[0]['phone']
             
             if not validate_phone_number(to_phone):
                 sms_status = f"failed: Invalid phone number format: {to_phone}"
@@ -307,11 +423,14 @@ def match():
                 except Exception as sms_error:
                     sms_status = f"failed: {sms_error}"
                     logging.error(f"Failed to send SMS: {sms_status}")
+        stages.lap('sms')
+        SMS_TOTAL.inc(route='/match', outcome=sms_status.split(':')[0])
         
         return jsonify({
             'status': 'success',
             'matches': matches,
-            'sms_status': sms_status
+            'sms_status': sms_status,
+            **({'degraded': degraded} if degraded else {})
         })
     
     except Exception as e:
@@ -322,7 +441,7 @@ def match():
 def get_hospitals():
     """Return hospital data."""
     try:
-        hospital_data = hospitals.to_dict(orient='records')
+        hospital_data = inventory.snapshot().records()
         return jsonify({'status': 'success', 'hospitals': hospital_data})
     except Exception as e:
         logging.error(f"Error in /hospitals: {e}")
@@ -335,15 +454,18 @@ def reveal_phone():
         data = request.json
         token = data.get('token')
         if not token or token not in phone_tokens:
+            PHONE_TOKEN_LOOKUPS.inc(result='miss')
             return jsonify({'status': 'error', 'message': 'Invalid or expired token.'}), 400
         
         token_data = phone_tokens[token]
         if time.time() > token_data['expires']:
             del phone_tokens[token]
+            PHONE_TOKEN_LOOKUPS.inc(result='expired')
             return jsonify({'status': 'error', 'message': 'Token has expired.'}), 400
         
         phone = token_data['phone']
         del phone_tokens[token]
+        PHONE_TOKEN_LOOKUPS.inc(result='hit')
         
         return jsonify({'status': 'success', 'phone': phone})
     
@@ -367,10 +489,11 @@ def schedule_appointment():
         if recipient_location not in ODISHA_LOCATIONS:
             return jsonify({'status': 'error', 'message': 'Invalid location.'}), 400
         
-        donor = donors[donors['id'] == donor_id]
-        if donor.empty:
+        stages = StageTimer(ROUTE_STAGE_SECONDS, route='/schedule_appointment')
+        donor = find_donor(donor_id)
+        if donor is None:
             return jsonify({'status': 'error', 'message': 'Donor not found.'}), 400
-        donor = donor.iloc[0]
+        stages.lap('donor_lookup')
         
         try:
             appt_datetime = datetime.strptime(appointment_date, '%Y-%m-%d %H:%M')
@@ -383,19 +506,8 @@ def schedule_appointment():
         if 'Unavailable' in availability['status']:
             return jsonify({'status': 'error', 'message': f"Donor is {availability['status']}."}), 400
         
-        appointments = pd.read_csv(APPOINTMENTS_FILE)
-        new_id = appointments['id'].max() + 1 if not appointments.empty else 1
-        new_appointment = pd.DataFrame([{
-            'id': new_id,
-            'donor_id': donor_id,
-            'recipient_location': recipient_location,
-            'appointment_date': appointment_date,
-            'notes': notes,
-            'status': 'Pending'
-        }])
-        
-        appointments = pd.concat([appointments, new_appointment], ignore_index=True)
-        appointments.to_csv(APPOINTMENTS_FILE, index=False)
+        appointment = appointments.add(int(donor_id), recipient_location, appt_datetime.strftime('%Y-%m-%d %H:%M'), notes)
+        stages.lap('store_write')
         
         sms_status = "not_attempted"
         if twilio_client:
@@ -422,10 +534,12 @@ def schedule_appointment():
                 except Exception as sms_error:
                     sms_status = f"failed: {sms_error}"
                     logging.error(f"Failed to send appointment SMS: {sms_status}")
+        stages.lap('sms')
+        SMS_TOTAL.inc(route='/schedule_appointment', outcome=sms_status.split(':')[0])
         
         return jsonify({
             'status': 'success',
-            'appointment': new_appointment.to_dict(orient='records')[0],
+            'appointment': appointment,
             'sms_status': sms_status
         })
     
@@ -442,23 +556,19 @@ def donation_history():
         if not donor_id:
             return jsonify({'status': 'error', 'message': 'Donor ID required.'}), 400
         
-        donor = donors[donors['id'] == donor_id]
-        if donor.empty:
+        stages = StageTimer(ROUTE_STAGE_SECONDS, route='/donation_history')
+        donor = find_donor(donor_id)
+        if donor is None:
             return jsonify({'status': 'error', 'message': 'Donor not found.'}), 400
-        donor = donor.iloc[0]
-        
-        appointments = pd.read_csv(APPOINTMENTS_FILE)
-        donor_appointments = appointments[
-            (appointments['donor_id'] == donor_id) & 
-            (appointments['status'] == 'Completed')
-        ]
+        stages.lap('donor_lookup')
         
         history = []
         if not pd.isna(donor['last_donation']):
             history.append(donor['last_donation'])
-        history.extend(donor_appointments['appointment_date'].apply(
-            lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M').strftime('%Y-%m-%d')
-        ).tolist())
+        # Stored dates are YYYY-MM-DD HH:MM, so the day is the first 10 characters
+        history.extend(appointment['appointment_date'][:10]
+                       for appointment in appointments.iter_query(donor_id=int(donor_id), status='Completed'))
+        stages.lap('history')
         
         return jsonify({
             'status': 'success',
@@ -470,6 +580,72 @@ def donation_history():
         logging.error(f"Error in /donation_history: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def appointment_filters():
+    """Read appointment filters from the query string."""
+    donor_id = request.args.get('donor_id')
+    if donor_id and not donor_id.isdigit():
+        raise ValueError('donor_id must be a positive integer.')
+    return {
+        'donor_id': int(donor_id) if donor_id else None,
+        'status': request.args.get('status') or None,
+        'start': parse_bound(request.args.get('from')),
+        'end': parse_bound(request.args.get('to'), end=True)
+    }
+
+def authorized_hospital():
+    """Return the hospital id from a valid bearer token, or None."""
+    token = request.headers.get('Authorization')
+    if not token or not token.startswith('Bearer '):
+        return None
+    return verify_jwt(token.split(' ')[1])
+
+@app.route('/appointments', methods=['GET'])
+def list_appointments():
+    """List appointments one page at a time, filtered by donor, status and date range."""
+    if not authorized_hospital():
+        return jsonify({'status': 'error', 'message': 'Missing or invalid token.'}), 401
+    try:
+        filters = appointment_filters()
+        limit = request.args.get('limit', '50')
+        if not limit.isdigit():
+            raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}.")
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        page, next_cursor = appointments.query(cursor=request.args.get('cursor'), limit=limit, **filters)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'appointments': page, 'next_cursor': next_cursor})
+
+@app.route('/appointments/export', methods=['GET'])
+def export_appointments():
+    """Stream all matching appointments as newline-delimited JSON."""
+    if not authorized_hospital():
+        return jsonify({'status': 'error', 'message': 'Missing or invalid token.'}), 401
+    try:
+        filters = appointment_filters()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    rows = (json.dumps(appointment) + '\n' for appointment in appointments.iter_query(**filters))
+    return Response(stream_with_context(rows), mimetype='application/x-ndjson')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['POST'])
+def profile():
+    """Sample all request threads for a few seconds and return collapsed stacks."""
+    if not ENABLE_PROFILER:
+        return jsonify({'status': 'error', 'message': 'Profiler is disabled.'}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 5)), 60)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'seconds must be a number.'}), 400
+    counts = profiler.sample(seconds)
+    if counts is None:
+        return jsonify({'status': 'error', 'message': 'A profile is already running.'}), 409
+    return Response(profiler.render_collapsed(counts), mimetype='text/plain')
+
 def haversine(loc1, loc2):
     """Calculate distance between two locations."""
     from haversine import haversine
@@ -0,0 +1,155 @@
+import base64
+import csv
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+APPOINTMENT_COLUMNS = ['id', 'donor_id', 'recipient_location', 'appointment_date', 'notes', 'status']
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY,
+    donor_id INTEGER NOT NULL,
+    recipient_location TEXT NOT NULL,
+    appointment_date TEXT NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_donor ON appointments (donor_id, appointment_date, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments (status, appointment_date, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (appointment_date, id);
+"""
+
+def encode_cursor(appointment_date, appointment_id):
+    """Encode a page position as an opaque token."""
+    raw = json.dumps([appointment_date, appointment_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a token from encode_cursor, raising ValueError if it is malformed."""
+    try:
+        appointment_date, appointment_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(appointment_date), int(appointment_id)
+    except Exception:
+        raise ValueError('Invalid cursor.')
+
+def parse_bound(value, end=False):
+    """Normalize a YYYY-MM-DD or YYYY-MM-DD HH:MM filter bound; a date-only end covers the whole day."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DATE_FORMAT).strftime(DATE_FORMAT)
+    except ValueError:
+        pass
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM.')
+    return day.strftime('%Y-%m-%d') + (' 23:59' if end else ' 00:00')
+
+class AppointmentStore:
+    """Appointments in an indexed SQLite table.
+
+    Dates are stored as YYYY-MM-DD HH:MM text, which sorts chronologically,
+    so filters and pagination run on the indexes without parsing. Pages are
+    keyed on (appointment_date, id), so a cursor stays valid while new
+    appointments are added. Each thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def import_csv(self, path, chunk_size=10000):
+        """Load appointments from a CSV file if the store is empty; return the number loaded.
+
+        The emptiness check and the inserts share one write transaction, so
+        when several processes start on a fresh database only one imports.
+        """
+        if not os.path.exists(path):
+            return 0
+        conn = self._connect()
+        loaded = 0
+        with open(path, newline='', encoding='utf-8') as f, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM appointments LIMIT 1').fetchone():
+                return 0
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append((int(float(row['id'])), int(float(row['donor_id'])), row['recipient_location'],
+                              row['appointment_date'], row.get('notes') or '', row['status']))
+                if len(batch) >= chunk_size:
+                    conn.executemany('INSERT INTO appointments VALUES (?, ?, ?, ?, ?, ?)', batch)
+                    loaded += len(batch)
+                    batch = []
+            conn.executemany('INSERT INTO appointments VALUES (?, ?, ?, ?, ?, ?)', batch)
+            loaded += len(batch)
+        return loaded
+
+    def add(self, donor_id, recipient_location, appointment_date, notes='', status='Pending'):
+        """Insert an appointment and return it."""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO appointments (donor_id, recipient_location, appointment_date, notes, status) VALUES (?, ?, ?, ?, ?)',
+                (donor_id, recipient_location, appointment_date, notes, status)
+            )
+        return {
+            'id': cursor.lastrowid,
+            'donor_id': donor_id,
+            'recipient_location': recipient_location,
+            'appointment_date': appointment_date,
+            'notes': notes,
+            'status': status
+        }
+
+    def query(self, donor_id=None, status=None, start=None, end=None, cursor=None, limit=50):
+        """Return one page of appointments in date order and the cursor for the next page (or None)."""
+        clauses, params = [], []
+        if donor_id is not None:
+            clauses.append('donor_id = ?')
+            params.append(donor_id)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if start:
+            clauses.append('appointment_date >= ?')
+            params.append(start)
+        if end:
+            clauses.append('appointment_date <= ?')
+            params.append(end)
+        if cursor:
+            clauses.append('(appointment_date, id) > (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connect().execute(
+            f"SELECT {', '.join(APPOINTMENT_COLUMNS)} FROM appointments {where} ORDER BY appointment_date, id LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(page[-1]['appointment_date'], page[-1]['id']) if len(rows) > limit else None
+        return page, next_cursor
+
+    def iter_query(self, batch_size=1000, **filters):
+        """Yield every matching appointment, fetching one page at a time."""
+        cursor = None
+        while True:
+            page, cursor = self.query(cursor=cursor, limit=batch_size, **filters)
+            yield from page
+            if cursor is None:
+                break
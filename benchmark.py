@@ -0,0 +1,201 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+
+import numpy as np
+import generate_training_data
+from generate_training_data import generate_donors, generate_recipients, generate_hospitals, ODISHA_LOCATIONS
+from matching import match_donor, load_data
+from inventory import InventoryStore
+from revision import git_commit
+from appointments import AppointmentStore
+from scheduler import ResultCache
+
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+RESULTS_FILE = 'bench_results.jsonl'
+APPOINTMENT_COLUMNS = ['id', 'donor_id', 'recipient_location', 'appointment_date', 'notes', 'status']
+
+def summarize(samples):
+    """Summarize timing samples (seconds) in milliseconds."""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        'n': len(ms),
+        'min_ms': ms[0],
+        'mean_ms': statistics.mean(ms),
+        'p50_ms': ms[len(ms) // 2],
+        'p95_ms': ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        'max_ms': ms[-1]
+    }
+
+def timed(fn, repeat):
+    """Call fn repeat times and return its timing summary."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def write_dataset(directory, n_donors, n_recipients, seed):
+    """Generate and save a seeded synthetic dataset, returning generation time in seconds.
+
+    Donors are written in chunks so memory stays flat at large sizes.
+    """
+    start = time.perf_counter()
+    generate_training_data.write_dataset(generate_donors, os.path.join(directory, 'donors.csv'), n_donors, seed=seed)
+    generate_training_data.write_dataset(generate_recipients, os.path.join(directory, 'recipients.csv'), n_recipients,
+                                         seed=seed + 1)
+    generate_hospitals(rng=np.random.default_rng(seed + 2)).to_csv(os.path.join(directory, 'hospitals.csv'), index=False)
+    pd.DataFrame(columns=APPOINTMENT_COLUMNS).to_csv(os.path.join(directory, 'appointments.csv'), index=False)
+    return time.perf_counter() - start
+
+def random_recipient():
+    """Build a random /match request body."""
+    return {
+        'location': random.choice(list(ODISHA_LOCATIONS.keys())),
+        'blood_type': random.choice(BLOOD_TYPES),
+        'urgency': random.randint(1, 10)
+    }
+
+def bench_endpoints(app_module, repeat):
+    """Time each JSON endpoint through the Flask test client.
+
+    Returns timings per endpoint and the number of error responses seen.
+    """
+    test_client = app_module.app.test_client()
+    errors = {}
+
+    def call(method, path, **kwargs):
+        response = test_client.open(path, method=method, **kwargs)
+        response.get_data()  # streamed bodies are only produced when read
+        if response.status_code >= 400:
+            errors[path] = errors.get(path, 0) + 1
+        return response
+
+    hospital_id, password = next(iter(app_module.REGISTERED_HOSPITALS.items()))
+    login = {'hospital_id': hospital_id, 'password': password}
+    token = call('POST', '/hospital/login', json=login).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    hospital = app_module.inventory.snapshot().records()[0]
+
+    donors = app_module.donor_index
+    available = donors[donors['last_donation'].astype(object) < (datetime.now() - timedelta(days=60)).strftime('%Y-%m-%d')]
+    donor_id = int(available.index[0]) if not available.empty else int(donors.index[0])
+    appointment_date = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d %H:%M')
+
+    def reveal():
+        match = call('POST', '/match', json=random_recipient()).get_json()
+        token = match['matches'][0]['contact_token'] if match.get('matches') else 'missing'
+        call('POST', '/reveal_phone', json={'token': token})
+
+    results = {
+        '/match': timed(lambda: call('POST', '/match', json=random_recipient()), repeat),
+        '/hospitals': timed(lambda: call('GET', '/hospitals'), repeat),
+        '/hospital/login': timed(lambda: call('POST', '/hospital/login', json=login), repeat),
+        '/hospital/update': timed(lambda: call('POST', '/hospital/update', headers=headers, json={
+            'name': hospital['name'],
+            'blood_type': hospital['blood_type'],
+            'stock': random.randint(0, 10),
+            'latitude': hospital['latitude'],
+            'longitude': hospital['longitude']
+        }), repeat),
+        '/match+/reveal_phone': timed(reveal, repeat),
+        '/schedule_appointment': timed(lambda: call('POST', '/schedule_appointment', json={
+            'donor_id': donor_id,
+            'recipient_location': 'Bhubaneswar',
+            'appointment_date': appointment_date,
+            'notes': 'benchmark'
+        }), repeat),
+        '/donation_history': timed(lambda: call('POST', '/donation_history', json={'donor_id': donor_id}), repeat),
+        '/appointments': timed(lambda: call('GET', f'/appointments?donor_id={donor_id}&limit=50', headers=headers), repeat),
+        '/appointments/export': timed(lambda: call('GET', '/appointments/export', headers=headers), repeat),
+        '/metrics': timed(lambda: call('GET', '/metrics'), repeat)
+    }
+    return results, errors
+
+def bench_socketio(app_module, n_clients, repeat):
+    """Time a Socket.IO broadcast to n_clients connected test clients."""
+    clients = [app_module.socketio.test_client(app_module.app) for _ in range(n_clients)]
+    payload = {'name': 'Benchmark Hospital', 'blood_type': 'O-', 'stock': 1, 'latitude': 20.3, 'longitude': 85.8}
+
+    def fan_out():
+        app_module.socketio.emit('hospital_update', payload)
+        for client in clients:
+            client.get_received()
+
+    try:
+        return timed(fan_out, repeat)
+    finally:
+        for client in clients:
+            client.disconnect()
+
+def run(sizes, repeat, n_clients, output, seed):
+    """Run the benchmark for each donor count and append results to output."""
+    root = os.getcwd()
+    commit = git_commit()
+    app_module = None
+    for n_donors in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            generate_seconds = write_dataset(directory, n_donors, 50, seed)
+            os.chdir(directory)
+            try:
+                load = timed(load_data, max(1, repeat // 10))
+                donors, recipients, hospitals = load_data()
+                if app_module is None:
+                    import app as app_module
+                    logging.getLogger().setLevel(logging.WARNING)
+                # Reloads sharded workers too, so nothing from the previous size answers a /match
+                app_module.load_donors(donors)
+                app_module.inventory = InventoryStore(hospitals)
+                app_module.appointments = AppointmentStore('appointments.db')
+                app_module.match_cache = ResultCache(ttl=app_module.match_cache.ttl)
+                snapshot = app_module.inventory.snapshot()
+
+                recipient_rows = [recipients.iloc[i % len(recipients)] for i in range(repeat)]
+                rows = iter(recipient_rows)
+                result = {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'commit': commit,
+                    'python': platform.python_version(),
+                    'seed': seed,
+                    'donors': len(donors),
+                    'hospitals': len(hospitals),
+                    'generate_s': generate_seconds,
+                    'load_data': load,
+                    'match_donor': timed(lambda: match_donor(next(rows), donors, snapshot), repeat),
+                }
+                result['endpoints'], result['endpoint_errors'] = bench_endpoints(app_module, repeat)
+                result.update({
+                    'socketio_fan_out': dict(bench_socketio(app_module, n_clients, repeat), clients=n_clients)
+                })
+            finally:
+                os.chdir(root)
+
+        with open(output, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"{n_donors} donors: match_donor p50 {result['match_donor']['p50_ms']:.1f} ms, "
+              f"/match p50 {result['endpoints']['/match']['p50_ms']:.1f} ms")
+
+def main():
+    """Benchmark the matching pipeline at increasing donor counts."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--donors', type=int, nargs='+', default=[10000, 100000], help='donor counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per operation')
+    parser.add_argument('--clients', type=int, default=50, help='Socket.IO clients for the fan-out benchmark')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSONL file to append results to')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    run(args.donors, args.repeat, args.clients, os.path.abspath(args.output), args.seed)
+
+if __name__ == "__main__":
+    main()
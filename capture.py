@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import re
+import time
+from logging.handlers import RotatingFileHandler
+from flask import g, request
+
+CAPTURE_ROUTES = ('/match', '/hospital/update', '/schedule_appointment')
+REDACTED = '<redacted>'
+
+# E.164 numbers and bare 10+ digit runs, wherever they appear in a string
+_PHONE_PATTERN = re.compile(r'(?<![\d+])\+?[1-9]\d{9,14}(?!\d)')
+
+def redact(value):
+    """Return a copy of a JSON value with phone numbers replaced."""
+    if isinstance(value, dict):
+        return {key: REDACTED if 'phone' in str(key).lower() else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return _PHONE_PATTERN.sub(REDACTED, value)
+    return value
+
+class RequestRecorder:
+    """Append captured requests to a size-rotated JSONL file.
+
+    Each line holds the wall-clock start time, method, path, query string,
+    redacted JSON body, whether a bearer token was sent (the token itself is
+    never written), response status and server-side duration.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5, routes=CAPTURE_ROUTES):
+        self.path = path
+        self.routes = set(routes)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger = logging.getLogger(f'capture.{path}')
+        self._logger.handlers = [handler]
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+
+    def record(self, entry):
+        self._logger.info(json.dumps(entry, separators=(',', ':'), default=str))
+
+    def install(self, app):
+        """Register request hooks on a Flask app."""
+
+        @app.before_request
+        def start_capture():
+            if request.path in self.routes:
+                g.capture_start = (time.time(), time.perf_counter())
+
+        @app.after_request
+        def finish_capture(response):
+            if 'capture_start' in g:
+                wall, start = g.capture_start
+                try:
+                    self.record({
+                        'ts': wall,
+                        'method': request.method,
+                        'path': request.path,
+                        'query': request.query_string.decode('utf-8', 'replace'),
+                        'body': redact(request.get_json(silent=True)),
+                        'auth': bool(request.headers.get('Authorization')),
+                        'status': response.status_code,
+                        'duration_ms': (time.perf_counter() - start) * 1000
+                    })
+                except Exception as e:
+                    logging.error(f"Failed to capture {request.path}: {e}")
+            return response
+
+        return self
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import argparse
 
 # Odisha locations with coordinates
 ODISHA_LOCATIONS = {
@@ -27,85 +27,105 @@ ODISHA_LOCATIONS = {
     'Khordha': (20.1883, 85.6214)
 }
 
-def generate_donors(n=100):
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+LOCATION_NAMES = list(ODISHA_LOCATIONS.keys())
+LOCATION_COORDS = np.array(list(ODISHA_LOCATIONS.values()))
+
+def random_locations(rng, n, spread):
+    """Pick n random Odisha locations, jittered by up to +/- spread degrees."""
+    coords = LOCATION_COORDS[rng.integers(0, len(LOCATION_COORDS), n)]
+    return coords + rng.uniform(-spread, spread, (n, 2))
+
+def generate_donors(n=100, rng=None, start_id=1):
     """Generate synthetic donor data with valid Indian phone numbers."""
-    blood_types = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
-    # Valid Indian mobile prefixes
-    mobile_prefixes = ['7', '8', '9']
-    data = []
-    for i in range(n):
-        location = random.choice(list(ODISHA_LOCATIONS.keys()))
-        lat, lon = ODISHA_LOCATIONS[location]
-        # Add slight variation to coordinates
-        lat += random.uniform(-0.05, 0.05)
-        lon += random.uniform(-0.05, 0.05)
-        last_donation = datetime.now() - timedelta(days=random.randint(0, 365))
-        # Generate valid phone number: +91 followed by 7/8/9 and 9 digits
-        prefix = random.choice(mobile_prefixes)
-        phone = f"+91{prefix}{random.randint(100000000, 999999999)}"
-        # For testing, set one donor to a verified number (uncomment if needed)
-        # if i == 0:
-        #     phone = "+919876543210"  # Replace with your verified Twilio number
-        data.append({
-            'id': i + 1,
-            'blood_type': random.choice(blood_types),
-            'latitude': lat,
-            'longitude': lon,
-            'last_donation': last_donation.strftime('%Y-%m-%d'),
-            'phone': phone
-        })
-    return pd.DataFrame(data)
+    rng = rng if rng is not None else np.random.default_rng()
+    coords = random_locations(rng, n, 0.05)
+    today = np.datetime64(datetime.now().date(), 'D')
+    last_donation = np.datetime_as_string(today - rng.integers(0, 366, n), unit='D')
+    # Valid phone number: +91 followed by 7/8/9 and 9 digits
+    prefixes = rng.choice([7, 8, 9], n)
+    numbers = prefixes * 1_000_000_000 + rng.integers(100000000, 1000000000, n)
+    # For testing, set one donor to a verified number (uncomment if needed)
+    # numbers[0] = 9876543210  # Replace with your verified Twilio number
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + n),
+        'blood_type': np.array(BLOOD_TYPES)[rng.integers(0, len(BLOOD_TYPES), n)],
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'last_donation': last_donation,
+        'phone': '+91' + pd.Series(numbers).astype(str)
+    })
 
-def generate_recipients(n=50):
+def generate_recipients(n=50, rng=None, start_id=1):
     """Generate synthetic recipient data."""
-    blood_types = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
-    data = []
-    for i in range(n):
-        location = random.choice(list(ODISHA_LOCATIONS.keys()))
-        lat, lon = ODISHA_LOCATIONS[location]
-        lat += random.uniform(-0.05, 0.05)
-        lon += random.uniform(-0.05, 0.05)
-        data.append({
-            'id': i + 1,
-            'blood_type': random.choice(blood_types),
-            'latitude': lat,
-            'longitude': lon,
-            'urgency': random.randint(1, 10)
-        })
-    return pd.DataFrame(data)
+    rng = rng if rng is not None else np.random.default_rng()
+    coords = random_locations(rng, n, 0.05)
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + n),
+        'blood_type': np.array(BLOOD_TYPES)[rng.integers(0, len(BLOOD_TYPES), n)],
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'urgency': rng.integers(1, 11, n)
+    })
 
-def generate_hospitals(n=20):
+def generate_hospitals(n=20, rng=None):
     """Generate synthetic hospital data with all blood types and low stock."""
-    blood_types = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
-    data = []
-    hospital_id = 1
-    for location in ODISHA_LOCATIONS.keys():
-        lat, lon = ODISHA_LOCATIONS[location]
-        for blood_type in blood_types:
-            # Ensure at least some hospitals have low stock
-            stock = random.randint(0, 3) if random.random() < 0.4 else random.randint(4, 10)
-            data.append({
-                'id': hospital_id,
-                'name': f"{location} Hospital {blood_type}",
-                'latitude': lat + random.uniform(-0.02, 0.02),
-                'longitude': lon + random.uniform(-0.02, 0.02),
-                'blood_type': blood_type,
-                'stock': stock
-            })
-            hospital_id += 1
-    return pd.DataFrame(data)
+    rng = rng if rng is not None else np.random.default_rng()
+    locations = np.repeat(LOCATION_NAMES, len(BLOOD_TYPES))
+    blood_types = np.tile(BLOOD_TYPES, len(LOCATION_NAMES))
+    count = len(locations)
+    coords = np.repeat(LOCATION_COORDS, len(BLOOD_TYPES), axis=0) + rng.uniform(-0.02, 0.02, (count, 2))
+    # Ensure at least some hospitals have low stock
+    stock = np.where(rng.random(count) < 0.4, rng.integers(0, 4, count), rng.integers(4, 11, count))
+    return pd.DataFrame({
+        'id': np.arange(1, count + 1),
+        'name': pd.Series(locations) + ' Hospital ' + pd.Series(blood_types),
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'blood_type': blood_types,
+        'stock': stock
+    })
+
+def write_dataset(generate, path, n, chunk_size=100000, seed=None, file_format='csv'):
+    """Generate n rows in chunks and write them to a CSV or Parquet file.
+
+    Only one chunk is held in memory at a time. Parquet output needs pyarrow.
+    """
+    rng = np.random.default_rng(seed)
+    writer = None
+    for start in range(0, max(n, 1), chunk_size):
+        chunk = generate(min(chunk_size, n - start), rng=rng, start_id=start + 1)
+        if file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        else:
+            chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    if writer is not None:
+        writer.close()
 
 def main():
     """Generate and save all datasets."""
-    donors = generate_donors(100)
-    recipients = generate_recipients(50)
-    hospitals = generate_hospitals()
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--donors', type=int, default=100)
+    parser.add_argument('--recipients', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    args = parser.parse_args()
     
-    donors.to_csv('donors.csv', index=False)
-    recipients.to_csv('recipients.csv', index=False)
+    extension = 'parquet' if args.format == 'parquet' else 'csv'
+    rng = np.random.default_rng(args.seed)
+    seeds = rng.integers(0, 2**32, 2)
+    write_dataset(generate_donors, f'donors.{extension}', args.donors, args.chunk_size, seeds[0], args.format)
+    write_dataset(generate_recipients, f'recipients.{extension}', args.recipients, args.chunk_size, seeds[1], args.format)
+    hospitals = generate_hospitals(rng=rng)
     hospitals.to_csv('hospitals.csv', index=False)
     
-    print(f"Generated: {len(donors)} donors, {len(recipients)} recipients, {len(hospitals)} hospitals")
+    print(f"Generated: {args.donors} donors, {args.recipients} recipients, {len(hospitals)} hospitals")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
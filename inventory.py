@@ -0,0 +1,233 @@
+import threading
+import logging
+import time
+import json
+import os
+import numpy as np
+import pandas as pd
+
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+HOSPITAL_COLUMNS = ['id', 'name', 'latitude', 'longitude', 'blood_type', 'stock']
+LOW_STOCK_THRESHOLD = 5
+
+class StockThresholds:
+    """Low-stock thresholds with per-hospital and per-blood-type overrides."""
+
+    def __init__(self, default=LOW_STOCK_THRESHOLD, blood_types=None, hospitals=None):
+        self.default = default
+        self.blood_types = dict(blood_types or {})
+        self.hospitals = dict(hospitals or {})
+
+    def for_hospital(self, name, blood_type):
+        """Return the threshold for one (hospital, blood_type) entry."""
+        if name in self.hospitals:
+            return self.hospitals[name]
+        return self.blood_types.get(blood_type, self.default)
+
+def load_thresholds():
+    """Load low-stock thresholds from the environment.
+
+    LOW_STOCK_THRESHOLD sets the default. LOW_STOCK_CONFIG may point to a JSON
+    file with optional "default", "blood_types" and "hospitals" keys, e.g.
+    {"blood_types": {"O-": 8}, "hospitals": {"Koraput Hospital O-": 10}}.
+    """
+    default = int(os.getenv('LOW_STOCK_THRESHOLD', LOW_STOCK_THRESHOLD))
+    path = os.getenv('LOW_STOCK_CONFIG')
+    if not path:
+        return StockThresholds(default)
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading low-stock config {path}: {e}")
+        return StockThresholds(default)
+    return StockThresholds(config.get('default', default), config.get('blood_types'), config.get('hospitals'))
+
+class InventoryChunk:
+    """Entries for one blood type, by position.
+
+    Coordinates are arrays and low-stock state is a boolean bitmap over the
+    same positions. A chunk is never mutated; replace returns a copy.
+    """
+
+    def __init__(self, records, index, latitudes, longitudes, low_stock):
+        self.records = records
+        self.index = index
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.low_stock = low_stock
+
+    def __len__(self):
+        return len(self.records)
+
+    def replace(self, slot, record, low_stock):
+        """Return a copy with the entry at slot set; slot == len(self) appends."""
+        grow = slot == len(self.records)
+        records = self.records + [None] if grow else list(self.records)
+        index = {**self.index, record['name']: slot} if grow else self.index
+        latitudes = np.append(self.latitudes, 0.0) if grow else self.latitudes.copy()
+        longitudes = np.append(self.longitudes, 0.0) if grow else self.longitudes.copy()
+        bitmap = np.append(self.low_stock, False) if grow else self.low_stock.copy()
+        records[slot] = record
+        latitudes[slot] = record['latitude']
+        longitudes[slot] = record['longitude']
+        bitmap[slot] = low_stock
+        return InventoryChunk(records, index, latitudes, longitudes, bitmap)
+
+class InventorySnapshot:
+    """Immutable, versioned view of hospital inventory.
+
+    Entries are split into one chunk per blood type, so an update copies
+    only its own chunk and shares the rest with the previous snapshot.
+    Snapshots are never mutated after creation; readers can hold one for a
+    whole request.
+    """
+
+    def __init__(self, version, chunks, next_id):
+        self.version = version
+        self._chunks = chunks
+        self.next_id = next_id
+        self._records = None
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks.values())
+
+    def get(self, name, blood_type):
+        """Return the record for (hospital, blood_type), or None."""
+        chunk = self._chunks.get(blood_type)
+        slot = chunk.index.get(name) if chunk is not None else None
+        return chunk.records[slot] if slot is not None else None
+
+    def records(self):
+        """Return all records ordered by id (built once per snapshot). Do not mutate them."""
+        if self._records is None:
+            records = [record for chunk in self._chunks.values() for record in chunk.records]
+            self._records = sorted(records, key=lambda record: record['id'])
+        return self._records
+
+    def to_frame(self):
+        """Return the snapshot as a DataFrame."""
+        return pd.DataFrame(self.records(), columns=HOSPITAL_COLUMNS)
+
+    def locations(self, blood_types=None, low_stock=False):
+        """Return (latitude, longitude) rows for the given blood types (all if None).
+
+        With low_stock set, only entries whose low-stock bit is set are included.
+        """
+        if blood_types is None:
+            chunks = list(self._chunks.values())
+        else:
+            chunks = [self._chunks[blood_type] for blood_type in blood_types if blood_type in self._chunks]
+        parts = [np.empty((0, 2))]
+        for chunk in chunks:
+            mask = chunk.low_stock if low_stock else slice(None)
+            parts.append(np.column_stack([chunk.latitudes[mask], chunk.longitudes[mask]]))
+        return np.concatenate(parts)
+
+class InventoryStore:
+    """Copy-on-write hospital inventory keyed by (hospital, blood_type)."""
+
+    def __init__(self, hospitals, thresholds=None):
+        self.thresholds = thresholds if thresholds is not None else load_thresholds()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saved_version = None
+        self._dirty = None
+        self._flush_path = None
+
+        chunks = {}
+        for blood_type, group in hospitals[HOSPITAL_COLUMNS].groupby('blood_type', sort=False):
+            records = group.to_dict(orient='records')
+            limits = np.array([self.thresholds.for_hospital(r['name'], blood_type) for r in records], dtype=float)
+            chunks[blood_type] = InventoryChunk(
+                records,
+                {record['name']: slot for slot, record in enumerate(records)},
+                group['latitude'].to_numpy(dtype=float),
+                group['longitude'].to_numpy(dtype=float),
+                group['stock'].to_numpy(dtype=float) < limits
+            )
+        next_id = int(hospitals['id'].max()) + 1 if not hospitals.empty else 1
+        self._snapshot = InventorySnapshot(0, chunks, next_id)
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        """Build a store from a hospitals CSV file."""
+        return cls(pd.read_csv(path), **kwargs)
+
+    def snapshot(self):
+        """Return the current snapshot."""
+        return self._snapshot
+
+    def is_low_stock(self, name, blood_type, stock):
+        """Check a stock level against the configured threshold."""
+        return stock < self.thresholds.for_hospital(name, blood_type)
+
+    def upsert(self, name, blood_type, stock, latitude, longitude):
+        """Insert or update one (hospital, blood_type) entry and publish a new snapshot.
+
+        Only the entry's blood-type chunk is copied, so the cost grows with
+        the hospitals holding that blood type, not the whole inventory.
+        """
+        with self._lock:
+            current = self._snapshot
+            chunk = current._chunks.get(blood_type) or InventoryChunk([], {}, np.empty(0), np.empty(0), np.empty(0, dtype=bool))
+            slot = chunk.index.get(name)
+            next_id = current.next_id
+            if slot is not None:
+                record_id = chunk.records[slot]['id']
+            else:
+                slot = len(chunk)
+                record_id = next_id
+                next_id += 1
+
+            record = {
+                'id': record_id,
+                'name': name,
+                'latitude': latitude,
+                'longitude': longitude,
+                'blood_type': blood_type,
+                'stock': stock
+            }
+            chunks = dict(current._chunks)
+            chunks[blood_type] = chunk.replace(slot, record, self.is_low_stock(name, blood_type, stock))
+
+            self._snapshot = InventorySnapshot(current.version + 1, chunks, next_id)
+            logging.debug(f"Inventory version {self._snapshot.version}: {name} {blood_type} stock={stock}")
+            if self._dirty is not None:
+                self._dirty.set()
+            return self._snapshot
+
+    def save(self, path):
+        """Write the current snapshot to CSV unless a newer one was already written."""
+        with self._save_lock:
+            snapshot = self._snapshot
+            if self._saved_version is not None and self._saved_version >= snapshot.version:
+                return
+            snapshot.to_frame().to_csv(path, index=False)
+            self._saved_version = snapshot.version
+
+    def start_flusher(self, path, interval=1.0):
+        """Save new versions to path from a background thread.
+
+        Updates only mark the store dirty; the flusher waits interval seconds
+        after the first change so a burst of updates costs one CSV write.
+        """
+        path = self._flush_path = os.path.abspath(path)
+        self._dirty = threading.Event()
+
+        def run():
+            while True:
+                self._dirty.wait()
+                time.sleep(interval)
+                self._dirty.clear()
+                try:
+                    self.save(path)
+                except Exception as e:
+                    logging.error(f"Error saving inventory to {path}: {e}")
+
+        threading.Thread(target=run, name='inventory-flusher', daemon=True).start()
+
+    def flush(self):
+        """Save unsaved updates to the flusher's path now, e.g. at exit."""
+        if self._flush_path and self._snapshot.version > (self._saved_version or 0):
+            self.save(self._flush_path)
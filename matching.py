@@ -1,9 +1,17 @@
 import pandas as pd
-from haversine import haversine
+from haversine import haversine, haversine_vector
 from datetime import datetime, timedelta
 import joblib
 import numpy as np
 import logging
+import os
+from dotenv import load_dotenv
+from inventory import InventorySnapshot, InventoryStore
+from model_registry import load_artifact, read_manifest
+from metrics import histogram, StageTimer
+from travel_time import TravelTimes
+
+load_dotenv()
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -29,14 +37,38 @@ donor_compatibility = {
     'AB+': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
 }
 
+def load_model():
+    """Load the model and scaler selected by the manifest.
+
+    MODEL_VERSION pins a registered version; otherwise the manifest's current
+    one is used. Without either, the legacy pickles are loaded.
+    """
+    version = os.getenv('MODEL_VERSION')
+    if version or read_manifest().get('current'):
+        model, scaler, _ = load_artifact(version)
+        return model, scaler
+    return joblib.load('donor_match_model.pkl'), joblib.load('scaler.pkl')
+
+MATCH_STAGE_SECONDS = histogram('match_stage_duration_seconds', 'Time spent in each match_donor stage.', ['stage'])
+MATCH_CANDIDATES = histogram('match_candidates', 'Compatible donors within the search radius per match.',
+                             buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000))
+
 try:
-    model = joblib.load('donor_match_model.pkl')
-    scaler = joblib.load('scaler.pkl')
+    model, scaler = load_model()
 except Exception as e:
     logging.error(f"Error loading model or scaler: {e}")
     model = None
     scaler = None
 
+# Optional precomputed road travel times (see travel_time.py); scoring uses them instead of straight-line distance
+TRAVEL_TIME_FILE = os.getenv('TRAVEL_TIME_FILE')
+travel_times = None
+if TRAVEL_TIME_FILE:
+    try:
+        travel_times = TravelTimes.load(TRAVEL_TIME_FILE)
+    except Exception as e:
+        logging.error(f"Error loading travel times from {TRAVEL_TIME_FILE}: {e}")
+
 def load_data():
     """Load donor, recipient, and hospital data."""
     try:
@@ -73,84 +105,144 @@ def calculate_reliability(last_donation):
         logging.error(f"Error calculating reliability for {last_donation}: {e}")
         return 0.5
 
-def match_donor(recipient, donors, hospitals, max_distance=50):
-    """Match donors to a recipient using AI model."""
-    matches = []
-    recipient_loc = (recipient['latitude'], recipient['longitude'])
+def calculate_reliability_vector(last_donations):
+    """Vectorized calculate_reliability over a Series of last-donation dates."""
+    now = pd.Timestamp(datetime.now())
+    dates = pd.to_datetime(last_donations, errors='coerce')
+    days_ago = (now - dates).dt.days
+    reliability = (1 - days_ago / 365).clip(0, 1)
+    reliability[dates + timedelta(days=56) > now] = 0.0  # Unavailable donors get zero reliability
+    reliability[dates.isna()] = 0.5
+    return reliability.to_numpy(dtype=float)
+
+def min_hospital_distances(donor_locs, hospital_locs, chunk_size=4096):
+    """Distance from each donor to its nearest hospital, in donor chunks."""
+    result = np.full(len(donor_locs), float('inf'))
+    if len(hospital_locs) == 0:
+        return result
+    for start in range(0, len(donor_locs), chunk_size):
+        chunk = donor_locs[start:start + chunk_size]
+        result[start:start + chunk_size] = haversine_vector(hospital_locs, chunk, comb=True).min(axis=1)
+    return result
+
+def select_hospitals(recipient, hospitals):
+    """Return coordinates of the hospitals donors are scored against.
+
+    These are low-stock hospitals holding a blood type compatible with the
+    recipient, or every hospital if none are low.
+    """
+    stages = StageTimer(MATCH_STAGE_SECONDS)
+    if not isinstance(hospitals, InventorySnapshot):
+        hospitals = InventoryStore(hospitals).snapshot()
     
     compatible_blood_types = donor_compatibility.get(recipient['blood_type'], [recipient['blood_type']])
-    low_stock_hospitals = hospitals[
-        (hospitals['blood_type'].isin(compatible_blood_types)) & 
-        (hospitals['stock'] < 5)
-    ]
-    logging.debug(f"Found {len(low_stock_hospitals)} low-stock hospitals for blood types: {compatible_blood_types}")
+    hospital_locs = hospitals.locations(compatible_blood_types, low_stock=True)
+    logging.debug(f"Found {len(hospital_locs)} low-stock hospitals for blood types: {compatible_blood_types}")
+    if not len(hospital_locs):
+        hospital_locs = hospitals.locations()
+    stages.lap('hospital_filter')
+    return hospital_locs
+
+def score_donors(recipient, donors, hospital_locs, max_distance=50, limit=10):
+    """Score donors against a recipient and return the best `limit`.
+
+    Candidates are selected with boolean arrays (complete, compatible, within
+    radius) and scored in a single model call. Returns (index label, match)
+    pairs ordered by match quality, ties keeping donor order.
+    """
+    stages = StageTimer(MATCH_STAGE_SECONDS)
+    recipient_loc = (recipient['latitude'], recipient['longitude'])
     
-    for _, donor in donors.iterrows():
-        if pd.isna(donor['latitude']) or pd.isna(donor['longitude']) or pd.isna(donor['blood_type']) or pd.isna(donor['phone']):
-            logging.warning(f"Skipping donor {donor['id']} due to missing data")
-            continue
-        
-        if recipient['blood_type'] in compatibility.get(donor['blood_type'], []):
-            donor_loc = (donor['latitude'], donor['longitude'])
-            distance = calculate_distance(donor_loc, recipient_loc)
-            if distance <= max_distance:
-                min_hospital_distance = float('inf')
-                if not low_stock_hospitals.empty:
-                    for _, hospital in low_stock_hospitals.iterrows():
-                        hospital_loc = (hospital['latitude'], hospital['longitude'])
-                        hospital_distance = calculate_distance(donor_loc, hospital_loc)
-                        min_hospital_distance = min(min_hospital_distance, hospital_distance)
-                else:
-                    for _, hospital in hospitals.iterrows():
-                        hospital_loc = (hospital['latitude'], hospital['longitude'])
-                        hospital_distance = calculate_distance(donor_loc, hospital_loc)
-                        min_hospital_distance = min(min_hospital_distance, hospital_distance)
-                
-                reliability = calculate_reliability(donor['last_donation'])
-                
-                features = [
-                    1,
-                    distance,
-                    min_hospital_distance if min_hospital_distance != float('inf') else 1000,
-                    recipient['urgency'],
-                    reliability
-                ]
-                
-                logging.debug(f"Donor {donor['id']} features: {features}")
-                
-                if any(pd.isna(f) or np.isinf(f) for f in features):
-                    logging.warning(f"Invalid features for donor {donor['id']}: {features}")
-                    match_quality = 0.0
-                elif model is None or scaler is None:
-                    logging.error(f"Model or scaler not loaded for donor {donor['id']}")
-                    match_quality = 0.0
-                else:
-                    try:
-                        features_array = np.array([features])
-                        features_array[:, [1, 2]] = scaler.transform(features_array[:, [1, 2]])
-                        match_quality = model.predict(features_array)[0]
-                        if np.isnan(match_quality) or np.isinf(match_quality):
-                            logging.warning(f"Invalid prediction for donor {donor['id']}: {match_quality}")
-                            match_quality = 0.0
-                    except Exception as e:
-                        logging.error(f"Prediction error for donor {donor['id']}: {e}")
-                        match_quality = 0.0
-                
-                matches.append({
-                    'donor_id': donor['id'],
-                    'blood_type': donor['blood_type'],
-                    'distance': distance,
-                    'urgency_score': recipient['urgency'],
-                    'donor_latitude': donor['latitude'],
-                    'donor_longitude': donor['longitude'],
-                    'hospital_distance': min_hospital_distance,
-                    'match_quality': float(max(0, min(match_quality, 1))),
-                    'phone': str(donor['phone'])
-                })
+    complete = donors[['latitude', 'longitude', 'blood_type', 'phone']].notna().all(axis=1).to_numpy()
+    if not complete.all():
+        logging.warning(f"Skipping {int((~complete).sum())} donors due to missing data")
+    giving_types = [blood_type for blood_type, recipients in compatibility.items() if recipient['blood_type'] in recipients]
+    compatible = donors['blood_type'].isin(giving_types).to_numpy()
+    
+    candidates = np.flatnonzero(complete & compatible)
+    donor_locs = donors[['latitude', 'longitude']].to_numpy(dtype=float)[candidates]
+    distances = haversine_vector(np.array([recipient_loc], dtype=float), donor_locs, comb=True)[:, 0] if len(candidates) else np.empty(0)
+    within = distances <= max_distance
+    candidates, donor_locs, distances = candidates[within], donor_locs[within], distances[within]
+    MATCH_CANDIDATES.observe(len(candidates))
+    stages.lap('candidate_select')
+    
+    if travel_times is not None:
+        # Road minutes as equivalent straight-line km, so the features keep the scale the model was trained on
+        travel_minutes = travel_times.to_target(donor_locs, recipient_loc)
+        distance_feature = travel_times.effective_km(travel_minutes)
+        hospital_feature = travel_times.effective_km(travel_times.min_to_targets(donor_locs, hospital_locs))
+    else:
+        distance_feature = distances
+        hospital_feature = min_hospital_distances(donor_locs, hospital_locs)
+    stages.lap('hospital_distance')
+    reliability = calculate_reliability_vector(donors['last_donation'].iloc[candidates])
+    features = np.column_stack([
+        np.ones(len(candidates)),
+        distance_feature,
+        np.where(np.isinf(hospital_feature), 1000, hospital_feature),
+        np.full(len(candidates), recipient['urgency'], dtype=float),
+        reliability
+    ])
+    stages.lap('features')
     
-    sorted_matches = sorted(matches, key=lambda x: x['match_quality'], reverse=True)[:10]
-    logging.debug(f"Found {len(sorted_matches)} matches")
-    return sorted_matches
+    match_quality = np.zeros(len(candidates))
+    valid = np.isfinite(features).all(axis=1)
+    if not valid.all():
+        logging.warning(f"Invalid features for donors {donors['id'].to_numpy()[candidates[~valid]].tolist()}")
+    if model is None or scaler is None:
+        if len(candidates):
+            logging.error("Model or scaler not loaded")
+    elif valid.any():
+        try:
+            features_array = features[valid]
+            features_array[:, [1, 2]] = scaler.transform(features_array[:, [1, 2]])
+            predictions = model.predict(features_array)
+            invalid_predictions = ~np.isfinite(predictions)
+            if invalid_predictions.any():
+                logging.warning(f"Invalid predictions for {int(invalid_predictions.sum())} donors")
+            match_quality[valid] = np.where(invalid_predictions, 0.0, predictions)
+        except Exception as e:
+            logging.error(f"Prediction error: {e}")
+    match_quality = np.clip(match_quality, 0, 1)
+    stages.lap('predict')
+    
+    top = np.argsort(-match_quality, kind='stable')[:limit]
+    rows = donors.iloc[candidates[top]]
+    if travel_times is None:
+        hospital_distances = hospital_feature
+    else:
+        # Reported hospital distance stays straight-line km; only the top rows need it
+        hospital_distances = np.full(len(candidates), float('inf'))
+        hospital_distances[top] = min_hospital_distances(donor_locs[top], hospital_locs)
+    scored = []
+    for i, (label, donor) in zip(top, rows.iterrows()):
+        match = {
+            'donor_id': donor['id'],
+            'blood_type': donor['blood_type'],
+            'distance': float(distances[i]),
+            'urgency_score': recipient['urgency'],
+            'donor_latitude': donor['latitude'],
+            'donor_longitude': donor['longitude'],
+            'hospital_distance': float(hospital_distances[i]),
+            'match_quality': float(match_quality[i]),
+            'phone': str(donor['phone']),
+            'last_donation': donor['last_donation']
+        }
+        if travel_times is not None:
+            match['travel_time_min'] = float(travel_minutes[i])
+        scored.append((label, match))
+    stages.lap('rank')
+    logging.debug(f"Found {len(scored)} matches out of {len(candidates)} candidates")
+    return scored
+
+def match_donor(recipient, donors, hospitals, max_distance=50):
+    """Match donors to a recipient using AI model.
+
+    `hospitals` may be a DataFrame or an InventorySnapshot.
+    """
+    hospital_locs = select_hospitals(recipient, hospitals)
+    return [match for _, match in score_donors(recipient, donors, hospital_locs, max_distance)]
 
 def main():
     """Test the AI matching logic."""
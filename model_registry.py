@@ -0,0 +1,100 @@
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import datetime
+import joblib
+
+MODELS_DIR = 'models'
+MANIFEST_NAME = 'manifest.json'
+
+def dump_bytes(obj):
+    """Serialize an object with joblib and return the bytes."""
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.getvalue()
+
+def sha256(data):
+    """Return the hex SHA-256 of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def manifest_path(models_dir=MODELS_DIR):
+    """Return the manifest path for a models directory."""
+    return os.path.join(models_dir, MANIFEST_NAME)
+
+def read_manifest(models_dir=MODELS_DIR):
+    """Read the manifest, or return an empty one if it does not exist."""
+    path = manifest_path(models_dir)
+    if not os.path.exists(path):
+        return {'current': None, 'models': []}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(manifest, models_dir=MODELS_DIR):
+    """Atomically replace the manifest."""
+    os.makedirs(models_dir, exist_ok=True)
+    path = manifest_path(models_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def save_artifact(model, scaler, recipe, metadata=None, models_dir=MODELS_DIR, make_current=True):
+    """Save a model and scaler as versioned files and register them.
+
+    The artifact id is a hash of the recipe, which must identify the training
+    content: parameters, library versions and hashes of the training data and
+    training code. Pickled trees are not byte-stable, so the files cannot be
+    the id themselves; each file's SHA-256 is recorded and checked on load.
+    If the id is already registered, the existing files are kept. The first
+    artifact registered becomes current even without make_current. Returns
+    (manifest entry, whether it was newly created).
+    """
+    artifact_id = sha256(json.dumps(recipe, sort_keys=True).encode())[:12]
+    manifest = read_manifest(models_dir)
+    entry = next((e for e in manifest['models'] if e['id'] == artifact_id), None)
+    created = entry is None
+    if created:
+        entry = {'id': artifact_id, 'created': datetime.now().isoformat(timespec='seconds'), **recipe, **(metadata or {})}
+        os.makedirs(models_dir, exist_ok=True)
+        for key, obj in (('model', model), ('scaler', scaler)):
+            data = dump_bytes(obj)
+            entry[key] = f"{key}-{artifact_id}.pkl"
+            entry[f"{key}_sha256"] = sha256(data)
+            with open(os.path.join(models_dir, entry[key]), 'wb') as f:
+                f.write(data)
+        manifest['models'].append(entry)
+    if make_current or not manifest.get('current'):
+        manifest['current'] = artifact_id
+    write_manifest(manifest, models_dir)
+    return entry, created
+
+def promote(artifact_id, models_dir=MODELS_DIR):
+    """Make a registered artifact the current one."""
+    manifest = read_manifest(models_dir)
+    if not any(e['id'] == artifact_id for e in manifest['models']):
+        raise ValueError(f"Unknown model version: {artifact_id}")
+    manifest['current'] = artifact_id
+    write_manifest(manifest, models_dir)
+
+def load_artifact(artifact_id=None, models_dir=MODELS_DIR):
+    """Load a registered model and scaler, verifying their hashes.
+
+    Defaults to the manifest's current artifact. Returns (model, scaler, entry).
+    """
+    manifest = read_manifest(models_dir)
+    artifact_id = artifact_id or manifest['current']
+    entry = next((e for e in manifest['models'] if e['id'] == artifact_id), None)
+    if entry is None:
+        raise ValueError(f"Unknown model version: {artifact_id}")
+
+    loaded = []
+    for key in ('model', 'scaler'):
+        with open(os.path.join(models_dir, entry[key]), 'rb') as f:
+            data = f.read()
+        if sha256(data) != entry[f"{key}_sha256"]:
+            raise ValueError(f"Checksum mismatch for {entry[key]}")
+        loaded.append(joblib.load(io.BytesIO(data)))
+    logging.info(f"Loaded model version {artifact_id}")
+    return loaded[0], loaded[1], entry
@@ -0,0 +1,42 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+
+def _describe(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def sample(seconds=5.0, interval=0.005):
+    """Sample the stacks of all other threads for a while.
+
+    Returns a Counter of collapsed stacks ("outer;...;inner") to sample
+    counts, the input format of flamegraph tools. Returns None if a profile
+    is already running.
+    """
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        own = threading.get_ident()
+        counts = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_describe(frame))
+                    frame = frame.f_back
+                counts[';'.join(reversed(stack))] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _lock.release()
+
+def render_collapsed(counts):
+    """Render collapsed stacks, most sampled first."""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
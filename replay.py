@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import jwt
+from dotenv import load_dotenv
+from revision import git_commit
+
+DATA_FILES = ('donors.csv', 'recipients.csv', 'hospitals.csv', 'appointments.csv')
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+def load_capture(paths):
+    """Read captured requests from JSONL files, oldest first."""
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+def percentiles(samples):
+    """Summarize latency samples (milliseconds)."""
+    if not samples:
+        return {'n': 0}
+    ms = sorted(samples)
+    pick = lambda q: ms[min(len(ms) - 1, int(len(ms) * q))]
+    return {
+        'n': len(ms),
+        'mean_ms': sum(ms) / len(ms),
+        'p50_ms': pick(0.50),
+        'p90_ms': pick(0.90),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': ms[-1]
+    }
+
+def shift_dates(value, offset):
+    """Return a copy of a JSON value with YYYY-MM-DD HH:MM strings moved by offset."""
+    if isinstance(value, dict):
+        return {key: shift_dates(item, offset) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shift_dates(item, offset) for item in value]
+    if isinstance(value, str):
+        try:
+            return (datetime.strptime(value, DATE_FORMAT) + offset).strftime(DATE_FORMAT)
+        except ValueError:
+            return value
+    return value
+
+def bearer_token(secret, hospital_id):
+    """Sign a hospital token; captured tokens are never stored."""
+    token = jwt.encode({'hospital_id': hospital_id, 'exp': datetime.utcnow() + timedelta(hours=1)}, secret, algorithm='HS256')
+    return f"Bearer {token}"
+
+class LocalTarget:
+    """Send requests to the Flask app in this process.
+
+    Unless in_place is set, the app runs on a scratch copy of the data files
+    (data_dir), so replayed updates and appointments leave the working
+    directory untouched. The model is still loaded from the working directory.
+    """
+
+    def __init__(self, in_place=False):
+        self.data_dir = os.getcwd()
+        if not in_place:
+            import matching  # loads the model before leaving the working directory
+            self.data_dir = tempfile.mkdtemp(prefix='replay-')
+            for name in DATA_FILES:
+                if os.path.exists(name):
+                    shutil.copy(name, self.data_dir)
+            database = os.getenv('APPOINTMENTS_DB', 'appointments.db')
+            scratch_database = os.path.join(self.data_dir, os.path.basename(database))
+            if os.path.exists(database):
+                with sqlite3.connect(database) as source, sqlite3.connect(scratch_database) as target:
+                    source.backup(target)
+            os.environ['APPOINTMENTS_DB'] = scratch_database
+            os.chdir(self.data_dir)
+        import app as app_module
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def send(self, method, url, body, headers):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        response = self._local.client.open(url, method=method, json=body, headers=headers)
+        return response.status_code
+
+class HttpTarget:
+    """Send requests to a running server."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, method, url, body, headers):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json', **headers})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+def replay(records, target, speed=1.0, concurrency=8, authorization=None):
+    """Replay records against a target and report throughput and latency.
+
+    Requests are released on the captured schedule divided by speed
+    (speed 0 sends as fast as the worker threads allow). Dates in bodies
+    are moved forward by the time between capture and replay, so
+    appointments that were in the future when captured still are. Latency
+    is measured from send to response; lag is how late a request left
+    against its schedule, which grows when the client cannot keep up.
+    """
+    results = []
+    lock = threading.Lock()
+    first = records[0]['ts'] if records else 0
+    offset = timedelta(seconds=time.time() - first)
+
+    def send(record, due):
+        url = record['path'] + (f"?{record['query']}" if record.get('query') else '')
+        headers = {'Authorization': authorization} if record.get('auth') and authorization else {}
+        body = shift_dates(record.get('body'), offset)
+        start = time.perf_counter()
+        try:
+            status = target.send(record['method'], url, body, headers)
+        except Exception as e:
+            logging.error(f"Replay of {url} failed: {e}")
+            status = None
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            results.append((record, status, elapsed, (start - due) * 1000))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            due = started + ((record['ts'] - first) / speed if speed > 0 else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, due)
+    duration = time.perf_counter() - started
+
+    routes = {}
+    for record, status, elapsed, _ in results:
+        routes.setdefault(record['path'], []).append(elapsed)
+    return {
+        'requests': len(results),
+        'duration_s': duration,
+        'throughput_rps': len(results) / duration if duration > 0 else 0.0,
+        'errors': sum(1 for _, status, _, _ in results if status is None or status >= 500),
+        'status_changed': sum(1 for record, status, _, _ in results if status != record.get('status')),
+        'max_lag_ms': max((lag for *_, lag in results), default=0.0),
+        'latency': percentiles([elapsed for _, _, elapsed, _ in results]),
+        'routes': {route: percentiles(samples) for route, samples in sorted(routes.items())},
+        'recorded': percentiles([record['duration_ms'] for record in records if 'duration_ms' in record])
+    }
+
+def main():
+    """Replay captured traffic against the app or a running server."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('captures', nargs='+', help='capture JSONL files, including rotated ones')
+    parser.add_argument('--target', default=None, help='server base URL; without it the app is loaded in-process')
+    parser.add_argument('--in-place', action='store_true',
+                        help='replay in-process against the data files in the working directory instead of a copy')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier; 0 sends as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', nargs='*', default=None, help='only replay these paths')
+    parser.add_argument('--hospital-id', default='hospital1', help='hospital used to sign replayed /hospital/update tokens')
+    parser.add_argument('--output', default=None, help='append the report as a JSON line to this file')
+    args = parser.parse_args()
+    load_dotenv()
+
+    records = load_capture(args.captures)
+    if args.routes:
+        records = [record for record in records if record['path'] in args.routes]
+    if not records:
+        parser.error('no captured requests to replay')
+
+    # Resolved before an in-process target switches to its scratch directory
+    output = os.path.abspath(args.output) if args.output else None
+    commit = git_commit()
+    target = HttpTarget(args.target) if args.target else LocalTarget(args.in_place)
+    secret = os.getenv('JWT_SECRET', 'your-secret-key')
+    report = replay(records, target, args.speed, args.concurrency, bearer_token(secret, args.hospital_id))
+    report.update({
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'target': args.target or f"in-process ({target.data_dir})",
+        'speed': args.speed,
+        'concurrency': args.concurrency,
+        'captures': args.captures
+    })
+    print(json.dumps(report, indent=2))
+    if output:
+        report['commit'] = commit
+        with open(output, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+
+if __name__ == "__main__":
+    main()
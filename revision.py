@@ -0,0 +1,8 @@
+import subprocess
+
+def git_commit():
+    """Return the current git commit, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
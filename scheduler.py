@@ -0,0 +1,147 @@
+import copy
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from metrics import counter, gauge, histogram
+
+# Seconds a request may wait for a slot, by minimum urgency
+DEADLINES = ((8, 30.0), (4, 10.0), (1, 3.0))
+
+QUEUE_DEPTH = gauge('match_queue_depth', 'Match requests waiting for a scoring slot.')
+RUNNING = gauge('match_running', 'Match requests currently scoring.')
+WAIT_SECONDS = histogram('match_queue_wait_seconds', 'Time spent waiting for a scoring slot.', ['outcome'])
+ADMISSIONS = counter('match_admissions_total', 'Match admission outcomes by urgency.', ['outcome', 'urgency'])
+CACHE_LOOKUPS = counter('match_cache_lookups_total', 'Cached match result lookups.', ['result'])
+
+class Admission:
+    """One request's place in the scheduler."""
+
+    def __init__(self, urgency, deadline):
+        self.urgency = urgency
+        self.deadline = deadline
+        self.state = 'pending'
+        self.wait = 0.0
+        self.pressure = 0.0
+
+    @property
+    def admitted(self):
+        return self.state == 'admitted'
+
+class MatchScheduler:
+    """Bounded, urgency-ordered admission in front of match scoring.
+
+    At most max_concurrent requests score at once; the rest wait in a
+    priority queue ordered by urgency, then arrival. A request that is still
+    queued at its deadline times out. When the queue is full, the least
+    urgent request (queued or arriving) is shed. Timed-out and shed requests
+    come back with admitted == False for the caller to degrade.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=32, deadlines=DEADLINES):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadlines = deadlines
+        self._cond = threading.Condition()
+        self._queue = []
+        self._running = 0
+        self._seq = 0
+
+    def deadline_for(self, urgency):
+        """Return the queueing deadline in seconds for an urgency."""
+        for min_urgency, seconds in self.deadlines:
+            if urgency >= min_urgency:
+                return seconds
+        return self.deadlines[-1][1]
+
+    @contextmanager
+    def slot(self, urgency):
+        """Wait for a scoring slot; the slot is released when the block exits."""
+        admission = self._acquire(urgency)
+        try:
+            yield admission
+        finally:
+            if admission.admitted:
+                self._release()
+
+    def _acquire(self, urgency):
+        start = time.monotonic()
+        admission = Admission(urgency, start + self.deadline_for(urgency))
+        with self._cond:
+            self._seq += 1
+            entry = (-urgency, self._seq, admission)
+            if self._running < self.max_concurrent and not self._queue:
+                self._running += 1
+                admission.state = 'admitted'
+            else:
+                self._enqueue(entry)
+                while admission.state == 'pending':
+                    if self._queue[0] is entry and self._running < self.max_concurrent:
+                        heapq.heappop(self._queue)
+                        self._running += 1
+                        admission.state = 'admitted'
+                        # The next request in line may also fit
+                        self._cond.notify_all()
+                        break
+                    remaining = admission.deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._remove(entry)
+                        admission.state = 'timeout'
+                        break
+                    self._cond.wait(remaining)
+            admission.pressure = len(self._queue) / self.max_queue if self.max_queue else 1.0
+            QUEUE_DEPTH.set(len(self._queue))
+            RUNNING.set(self._running)
+
+        admission.wait = time.monotonic() - start
+        WAIT_SECONDS.observe(admission.wait, outcome=admission.state)
+        ADMISSIONS.inc(outcome=admission.state, urgency=str(urgency))
+        return admission
+
+    def _enqueue(self, entry):
+        if len(self._queue) >= self.max_queue:
+            lowest = max(self._queue) if self._queue else None
+            if lowest is None or entry[:2] > lowest[:2]:
+                entry[2].state = 'shed'
+                return
+            self._remove(lowest)
+            lowest[2].state = 'shed'
+        heapq.heappush(self._queue, entry)
+
+    def _remove(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._running -= 1
+            RUNNING.set(self._running)
+            self._cond.notify_all()
+
+    def depth(self):
+        """Return the number of queued requests."""
+        with self._cond:
+            return len(self._queue)
+
+class ResultCache:
+    """Recent match results kept for serving degraded responses."""
+
+    def __init__(self, ttl=120):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def put(self, key, matches):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(matches))
+
+    def get(self, key):
+        """Return a copy of a fresh cached result, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            CACHE_LOOKUPS.inc(result='miss')
+            return None
+        CACHE_LOOKUPS.inc(result='hit')
+        return copy.deepcopy(entry[1])
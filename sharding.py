@@ -0,0 +1,180 @@
+import logging
+import multiprocessing
+import os
+import threading
+import numpy as np
+from haversine import haversine, haversine_vector
+from generate_training_data import ODISHA_LOCATIONS
+from matching import select_hospitals, score_donors
+from metrics import histogram
+
+MATCH_SHARDS_QUERIED = histogram('match_shards_queried', 'District shards scored per sharded match.',
+                                 buckets=(0, 1, 2, 4, 8, 16, 32))
+
+def assign_districts(donors, centroids, chunk_size=65536):
+    """Return the index of the nearest district centroid for each donor.
+
+    Donors with missing coordinates are assigned to district 0; scoring
+    skips them anyway.
+    """
+    locs = donors[['latitude', 'longitude']].to_numpy(dtype=float)
+    districts = np.zeros(len(locs), dtype=int)
+    for start in range(0, len(locs), chunk_size):
+        chunk = locs[start:start + chunk_size]
+        distances = haversine_vector(centroids, chunk, comb=True)
+        distances[np.isnan(distances)] = np.inf
+        districts[start:start + chunk_size] = distances.argmin(axis=1)
+    return districts
+
+def _worker(conn):
+    """Hold the shards sent to this process and serve scoring requests for them."""
+    shards = {}
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        kind, payload = message
+        try:
+            if kind == 'clear':
+                shards.clear()
+                conn.send(('ok', None))
+                continue
+            if kind == 'load':
+                shard_id, shard = payload
+                shards[shard_id] = shard
+                conn.send(('ok', None))
+                continue
+            recipient, hospital_locs, max_distance, limit, shard_ids = payload
+            scored = []
+            for shard_id in shard_ids:
+                scored.extend(score_donors(recipient, shards[shard_id], hospital_locs, max_distance, limit))
+            conn.send(('ok', scored))
+        except Exception as e:
+            logging.error(f"Error handling {kind} in matcher worker: {e}")
+            conn.send(('error', str(e)))
+    conn.close()
+
+class ShardedMatcher:
+    """Donor matching spread over worker processes by district.
+
+    Donors are partitioned by nearest ODISHA_LOCATIONS centroid, and each
+    worker process holds only the shards assigned to it. A match is sent
+    only to shards whose region (centroid plus the distance to its farthest
+    donor) intersects the search radius, and the per-shard top results are
+    merged.
+
+    Workers are forked when the matcher is created and receive their shards
+    over their pipe in load(). Create the matcher before loading the donor
+    data so workers do not inherit the full frame; passing donors to the
+    constructor loads them straight away, after the fork.
+    """
+
+    def __init__(self, donors=None, workers=None, locations=ODISHA_LOCATIONS):
+        self.names = list(locations.keys())
+        self.centroids = np.array(list(locations.values()), dtype=float)
+        self.regions = {}
+        self.worker_of = {}
+
+        workers = max(1, workers or os.cpu_count() or 1)
+        context = multiprocessing.get_context('fork')
+        self._conns = []
+        self._locks = []
+        self._processes = []
+        for _ in range(workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._locks.append(threading.Lock())
+            self._processes.append(process)
+        logging.info(f"Started {workers} matcher workers")
+        if donors is not None:
+            self.load(donors)
+
+    def load(self, donors):
+        """Partition donors by district and send each worker its shards.
+
+        Any previously loaded donors are dropped first, so do not match while
+        loading. The parent keeps only each shard's region; shards are sent
+        one at a time, so at most one extra shard copy exists in the parent.
+        """
+        self.regions = {}
+        self.worker_of = {}
+        for worker, (conn, lock) in enumerate(zip(self._conns, self._locks)):
+            with lock:
+                conn.send(('clear', None))
+                status, result = conn.recv()
+            if status != 'ok':
+                raise RuntimeError(f"Matcher worker {worker} failed to clear its shards: {result}")
+        districts = assign_districts(donors, self.centroids)
+        shard_ids, sizes = np.unique(districts, return_counts=True)
+
+        # Largest shards first, each to the least loaded worker
+        loads = [0] * len(self._conns)
+        for shard_id, size in sorted(zip(shard_ids.tolist(), sizes.tolist()), key=lambda item: item[1], reverse=True):
+            worker = loads.index(min(loads))
+            loads[worker] += size
+            shard = donors[districts == shard_id]
+            distances = haversine_vector(self.centroids[shard_id], shard[['latitude', 'longitude']].to_numpy(dtype=float), comb=True)
+            radius = float(np.nanmax(distances)) if np.isfinite(distances).any() else 0.0
+            with self._locks[worker]:
+                self._conns[worker].send(('load', (shard_id, shard)))
+                status, result = self._conns[worker].recv()
+            if status != 'ok':
+                raise RuntimeError(f"Matcher worker failed to load shard {shard_id}: {result}")
+            self.regions[shard_id] = (self.names[shard_id], tuple(self.centroids[shard_id]), radius, size)
+            self.worker_of[shard_id] = worker
+        logging.info(f"Loaded {len(shard_ids)} district shards into {len(self._conns)} matcher workers")
+
+    def shards_for(self, recipient_loc, max_distance):
+        """Return ids of shards whose region intersects the search radius."""
+        return [shard_id for shard_id, (_, centroid, radius, _) in self.regions.items()
+                if haversine(recipient_loc, centroid) - radius <= max_distance]
+
+    def match(self, recipient, hospitals, max_distance=50, limit=10):
+        """Match donors to a recipient across the relevant shards."""
+        hospital_locs = select_hospitals(recipient, hospitals)
+        shard_ids = self.shards_for((recipient['latitude'], recipient['longitude']), max_distance)
+        MATCH_SHARDS_QUERIED.observe(len(shard_ids))
+
+        by_worker = {}
+        for shard_id in shard_ids:
+            by_worker.setdefault(self.worker_of[shard_id], []).append(shard_id)
+
+        # Lock in worker order so concurrent fan-outs cannot deadlock
+        workers = sorted(by_worker)
+        for worker in workers:
+            self._locks[worker].acquire()
+        try:
+            sent = []
+            try:
+                for worker in workers:
+                    self._conns[worker].send(('match', (recipient, hospital_locs, max_distance, limit, by_worker[worker])))
+                    sent.append(worker)
+            finally:
+                # Always drain replies so a pipe never holds a stale answer
+                replies = [self._conns[worker].recv() for worker in sent]
+        finally:
+            for worker in workers:
+                self._locks[worker].release()
+
+        scored = []
+        for status, result in replies:
+            if status != 'ok':
+                raise RuntimeError(f"Matcher worker failed: {result}")
+            scored.extend(result)
+        # Shards keep the original donor index, so ties resolve in donor order as in match_donor
+        scored.sort(key=lambda item: (-item[1]['match_quality'], item[0]))
+        return [match for _, match in scored[:limit]]
+
+    def close(self):
+        """Stop the worker processes."""
+        for conn, lock in zip(self._conns, self._locks):
+            with lock:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            process.join(timeout=5)
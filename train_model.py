@@ -1,77 +1,211 @@
 import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
-import joblib
-import random
+from sklearn.metrics import mean_squared_error, r2_score
+from model_registry import save_artifact, promote, read_manifest, sha256
+import argparse
+import hashlib
+import inspect
+import math
+import time
+
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+COMPATIBILITY_MATRIX = {
+    'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
+    'O+': ['O+', 'A+', 'B+', 'AB+'],
+    'A-': ['A-', 'A+', 'AB-', 'AB+'],
+    'A+': ['A+', 'AB+'],
+    'B-': ['B-', 'B+', 'AB-', 'AB+'],
+    'B+': ['B+', 'AB+'],
+    'AB-': ['AB-', 'AB+'],
+    'AB+': ['AB+']
+}
+# COMPATIBLE[donor, recipient] is 1 when donor blood can be given to recipient
+COMPATIBLE = np.array([[1 if recipient in COMPATIBILITY_MATRIX[donor] else 0 for recipient in BLOOD_TYPES]
+                       for donor in BLOOD_TYPES])
 
 # Simulate training data
-def generate_training_data(n_samples=1000):
+def generate_training_data(n_samples=1000, rng=None):
     """Generate synthetic training data for donor matching."""
-    blood_types = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
-    compatibility_matrix = {
-        'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
-        'O+': ['O+', 'A+', 'B+', 'AB+'],
-        'A-': ['A-', 'A+', 'AB-', 'AB+'],
-        'A+': ['A+', 'AB+'],
-        'B-': ['B-', 'B+', 'AB-', 'AB+'],
-        'B+': ['B+', 'AB+'],
-        'AB-': ['AB-', 'AB+'],
-        'AB+': ['AB+']
-    }
+    rng = rng if rng is not None else np.random.default_rng()
+    donor_blood = rng.integers(0, len(BLOOD_TYPES), n_samples)
+    recipient_blood = rng.integers(0, len(BLOOD_TYPES), n_samples)
+    is_compatible = COMPATIBLE[donor_blood, recipient_blood]
+    distance = rng.uniform(0, 50, n_samples)  # km
+    hospital_distance = np.where(rng.random(n_samples) > 0.2, rng.uniform(0, 100, n_samples), 1000)
+    urgency = rng.integers(1, 11, n_samples)
+    days_since_donation = rng.integers(0, 366, n_samples)
+    reliability = np.clip(1 - (days_since_donation / 365), 0, 1)
     
-    data = []
-    for _ in range(n_samples):
-        donor_blood = random.choice(blood_types)
-        recipient_blood = random.choice(blood_types)
-        is_compatible = 1 if recipient_blood in compatibility_matrix[donor_blood] else 0
-        distance = random.uniform(0, 50)  # km
-        hospital_distance = random.uniform(0, 100) if random.random() > 0.2 else 1000
-        urgency = random.randint(1, 10)
-        days_since_donation = random.randint(0, 365)
-        reliability = max(0, min(1, 1 - (days_since_donation / 365)))
-        
-        # Target: match quality (higher for compatible, closer, urgent, reliable)
-        match_quality = (
-            is_compatible * 0.4 +
-            (1 - distance / 50) * 0.2 +
-            (1 - min(hospital_distance, 100) / 100) * 0.2 +
-            (urgency / 10) * 0.1 +
-            reliability * 0.1
-        )
-        if not is_compatible:
-            match_quality = 0
-        
-        data.append([
-            is_compatible,
-            distance,
-            hospital_distance,
-            urgency,
-            reliability,
-            match_quality
-        ])
+    # Target: match quality (higher for compatible, closer, urgent, reliable)
+    match_quality = (
+        is_compatible * 0.4 +
+        (1 - distance / 50) * 0.2 +
+        (1 - np.minimum(hospital_distance, 100) / 100) * 0.2 +
+        (urgency / 10) * 0.1 +
+        reliability * 0.1
+    )
+    match_quality[is_compatible == 0] = 0
     
-    return np.array(data)
+    return np.column_stack([
+        is_compatible,
+        distance,
+        hospital_distance,
+        urgency,
+        reliability,
+        match_quality
+    ]).astype(float)
+
+def iter_training_data(n_samples, chunk_size=100000, seed=None):
+    """Yield synthetic training data in chunks of at most chunk_size rows."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, chunk_size):
+        yield generate_training_data(min(chunk_size, n_samples - start), rng)
 
-def train_model():
-    """Train and save a Random Forest model."""
-    # Generate training data
-    data = generate_training_data(1000)
+def split_features(data, scaler):
+    """Split a data chunk into scaled features and target."""
     X = data[:, :-1]  # All columns except the last (match_quality)
     y = data[:, -1]   # Last column (match_quality)
-    
     # Scale distance-based features (indices 1 and 2)
+    X[:, [1, 2]] = scaler.transform(X[:, [1, 2]])
+    return X, y
+
+def fit(n_samples=1000, n_estimators=100, max_depth=None, chunk_size=100000, seed=42, n_jobs=-1):
+    """Fit a scaler and Random Forest, streaming the training data in chunks.
+
+    The data is generated twice from the same seed: once to fit the scaler,
+    once to grow the forest. With several chunks, each chunk grows its share
+    of the trees on top of the previous ones (warm start), so only one chunk
+    is ever in memory. Returns (model, scaler, SHA-256 of the training data).
+    """
     scaler = StandardScaler()
-    X[:, [1, 2]] = scaler.fit_transform(X[:, [1, 2]])
+    for chunk in iter_training_data(n_samples, chunk_size, seed):
+        scaler.partial_fit(chunk[:, [1, 2]])
+    
+    n_chunks = math.ceil(n_samples / chunk_size)
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=seed,
+                                  n_jobs=n_jobs, warm_start=True)
+    grown = 0
+    digest = hashlib.sha256()
+    for i, chunk in enumerate(iter_training_data(n_samples, chunk_size, seed)):
+        digest.update(chunk.tobytes())
+        target = round(n_estimators * (i + 1) / n_chunks)
+        if target == grown:
+            continue
+        X, y = split_features(chunk, scaler)
+        model.n_estimators = target
+        model.fit(X, y)
+        grown = target
+    
+    # Requests are already served concurrently; threaded prediction per request only adds overhead
+    model.n_jobs = None
+    return model, scaler, digest.hexdigest()
+
+def code_sha256():
+    """Hash the source of the code that generates training data and fits models."""
+    return sha256(''.join(inspect.getsource(fn) for fn in (generate_training_data, split_features, fit)).encode())
+
+def evaluate(model, scaler, seed=42, n_samples=10000):
+    """Score a model on held-out data and measure its inference latency."""
+    X, y = split_features(generate_training_data(n_samples, np.random.default_rng(seed + 1)), scaler)
+    predictions = model.predict(X)
     
-    # Train Random Forest model
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X, y)
+    batch = X[:1000]
+    batch_times = []
+    single_times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        model.predict(batch)
+        batch_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        model.predict(X[:1])
+        single_times.append(time.perf_counter() - start)
     
-    # Save model and scaler
-    joblib.dump(model, 'donor_match_model.pkl')
-    joblib.dump(scaler, 'scaler.pkl')
+    return {
+        'mse': float(mean_squared_error(y, predictions)),
+        'r2': float(r2_score(y, predictions)),
+        'batch_1000_ms': min(batch_times) * 1000,
+        'single_ms': min(single_times) * 1000
+    }
+
+def register(model, scaler, metrics, n_samples, n_estimators, max_depth, chunk_size, seed, data_sha256, make_current=True):
+    """Register a fitted model as a versioned artifact and report what happened."""
+    recipe = {
+        'params': {'n_estimators': n_estimators, 'max_depth': max_depth},
+        'n_samples': n_samples,
+        'chunk_size': chunk_size,
+        'seed': seed,
+        'data_sha256': data_sha256,
+        'code_sha256': code_sha256(),
+        'sklearn': sklearn.__version__,
+        'numpy': np.__version__
+    }
+    entry, created = save_artifact(model, scaler, recipe, {'metrics': metrics}, make_current=make_current)
+    
+    status = 'saved' if created else f"already registered (created {entry['created']}); reused existing files"
+    current = read_manifest()['current'] == entry['id']
+    print(f"Model {entry['id']} {status} (r2={metrics['r2']:.4f}, batch_1000={metrics['batch_1000_ms']:.1f} ms)"
+          f"{'; current' if current else ''}.")
+    return entry
+
+def train_model(n_samples=1000, n_estimators=100, max_depth=None, chunk_size=100000, seed=42, n_jobs=-1, make_current=True):
+    """Train and save a Random Forest model as a versioned artifact."""
+    model, scaler, data_sha256 = fit(n_samples, n_estimators, max_depth, chunk_size, seed, n_jobs)
+    metrics = evaluate(model, scaler, seed)
+    return register(model, scaler, metrics, n_samples, n_estimators, max_depth, chunk_size, seed, data_sha256, make_current)
+
+def sweep(n_samples=1000, tree_counts=(25, 50, 100, 200), depths=(None, 8, 12, 16), chunk_size=100000, seed=42,
+          n_jobs=-1, max_latency_ms=None):
+    """Train a grid of tree counts and depths and report accuracy against latency.
+
+    If max_latency_ms is given, the most accurate model whose 1000-row batch
+    latency fits the budget is kept, then saved and promoted.
+    """
+    results = []
+    best = None
+    for n_estimators in tree_counts:
+        for max_depth in depths:
+            model, scaler, data_sha256 = fit(n_samples, n_estimators, max_depth, chunk_size, seed, n_jobs)
+            metrics = evaluate(model, scaler, seed)
+            results.append({'n_estimators': n_estimators, 'max_depth': max_depth, **metrics})
+            print(f"n_estimators={n_estimators:<4} max_depth={str(max_depth):<5} r2={metrics['r2']:.4f} "
+                  f"mse={metrics['mse']:.5f} batch_1000={metrics['batch_1000_ms']:.1f} ms single={metrics['single_ms']:.2f} ms")
+            if max_latency_ms is not None and metrics['batch_1000_ms'] <= max_latency_ms:
+                if best is None or metrics['r2'] > best['metrics']['r2']:
+                    best = {'model': model, 'scaler': scaler, 'metrics': metrics, 'n_estimators': n_estimators,
+                            'max_depth': max_depth, 'data_sha256': data_sha256}
+    
+    if max_latency_ms is not None:
+        if best is None:
+            print(f"No configuration fits {max_latency_ms} ms per 1000 rows.")
+        else:
+            register(best['model'], best['scaler'], best['metrics'], n_samples, best['n_estimators'], best['max_depth'],
+                     chunk_size, seed, best['data_sha256'])
+    return results
+
+def main():
+    """Train, sweep or promote donor matching models."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--samples', type=int, default=1000, help='training rows')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='rows generated and fitted at a time')
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=-1, help='cores used for fitting (-1 for all)')
+    parser.add_argument('--no-promote', action='store_true', help='register the model without making it current')
+    parser.add_argument('--sweep', action='store_true', help='sweep tree counts and depths')
+    parser.add_argument('--max-latency-ms', type=float, default=None, help='with --sweep, promote the best model within this budget')
+    parser.add_argument('--promote', metavar='VERSION', help='make an existing model version current')
+    args = parser.parse_args()
     
-    print("Model and scaler saved successfully.")
+    if args.promote:
+        promote(args.promote)
+        print(f"Model {args.promote} promoted.")
+    elif args.sweep:
+        sweep(args.samples, chunk_size=args.chunk_size, seed=args.seed, n_jobs=args.jobs, max_latency_ms=args.max_latency_ms)
+    else:
+        train_model(args.samples, args.trees, args.max_depth, args.chunk_size, args.seed, args.jobs, not args.no_promote)
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,203 @@
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from haversine import haversine_vector
+from generate_training_data import ODISHA_LOCATIONS
+
+# Grid covering Odisha: (south, west, north, east) in degrees
+BOUNDS = (17.7, 81.3, 22.7, 87.6)
+GRID_STEP = 0.05
+TRAVEL_TIME_FILE = 'travel_times.npz'
+
+# Estimate used where no routed time exists: slower, more winding roads in hill districts
+PLAIN_SPEED_KMH = 45.0
+PLAIN_DETOUR = 1.3
+HILL_SPEED_KMH = 28.0
+HILL_DETOUR = 1.7
+HILL_DISTRICTS = {'Koraput', 'Malkangiri', 'Rayagada'}
+
+# Converts minutes back to straight-line km on plain terrain, keeping model features on their trained scale
+REFERENCE_SPEED_KMH = PLAIN_SPEED_KMH / PLAIN_DETOUR
+
+_CENTROIDS = np.array(list(ODISHA_LOCATIONS.values()), dtype=float)
+_HILLY = np.array([name in HILL_DISTRICTS for name in ODISHA_LOCATIONS])
+
+def _minutes_per_km(locs):
+    """Estimated minutes per straight-line km around each point, by nearest district."""
+    nearest = haversine_vector(_CENTROIDS, locs, comb=True).argmin(axis=1)
+    hilly = _HILLY[nearest]
+    return np.where(hilly, HILL_DETOUR / HILL_SPEED_KMH, PLAIN_DETOUR / PLAIN_SPEED_KMH) * 60
+
+def estimate_minutes(sources, targets, source_rates=None, target_rates=None):
+    """Estimate road minutes from each source to each target, shape (sources, targets).
+
+    Per-point minutes per km may be passed in when they are already known.
+    """
+    sources = np.asarray(sources, dtype=float).reshape(-1, 2)
+    targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+    if len(sources) == 0 or len(targets) == 0:
+        return np.zeros((len(sources), len(targets)))
+    source_rates = _minutes_per_km(sources) if source_rates is None else source_rates
+    target_rates = _minutes_per_km(targets) if target_rates is None else target_rates
+    km = haversine_vector(targets, sources, comb=True)
+    return km * ((source_rates[:, None] + target_rates[None, :]) / 2)
+
+class TravelTimes:
+    """Precomputed road travel times from grid cells to fixed targets.
+
+    Targets are the grid cells containing the Odisha locations and known
+    hospitals. minutes[t, c] is the time in minutes from cell c to target t,
+    stored as float32. Lookups snap points to cells, index the matrix and
+    add the estimated difference between the exact points and the cell
+    centres, so points within a cell keep their relative distances. Pairs in
+    the same or adjacent cells, points outside the grid and targets without
+    a column use estimate_minutes.
+    """
+
+    def __init__(self, bounds, step, target_cells, minutes):
+        self.south, self.west, north, east = bounds
+        self.step = step
+        # Round before ceil so float error (e.g. 5.0 / 0.05) cannot add a row
+        self.n_rows = int(np.ceil(round((north - self.south) / step, 6)))
+        self.n_cols = int(np.ceil(round((east - self.west) / step, 6)))
+        self.target_cells = np.asarray(target_cells, dtype=np.int32)
+        self.minutes = np.asarray(minutes, dtype=np.float32)
+        self._column_of_cell = np.full(self.n_rows * self.n_cols, -1, dtype=np.int32)
+        self._column_of_cell[self.target_cells] = np.arange(len(self.target_cells), dtype=np.int32)
+
+    @property
+    def bounds(self):
+        return (self.south, self.west, self.south + self.n_rows * self.step, self.west + self.n_cols * self.step)
+
+    def cells(self, locs):
+        """Return the grid cell of each (lat, lon) point, or -1 outside the grid."""
+        locs = np.asarray(locs, dtype=float).reshape(-1, 2)
+        rows = np.floor((locs[:, 0] - self.south) / self.step)
+        cols = np.floor((locs[:, 1] - self.west) / self.step)
+        inside = (rows >= 0) & (rows < self.n_rows) & (cols >= 0) & (cols < self.n_cols)
+        return np.where(inside, np.nan_to_num(rows) * self.n_cols + np.nan_to_num(cols), -1).astype(np.int64)
+
+    def cell_centres(self, cells):
+        """Return the (lat, lon) centre of each cell."""
+        cells = np.asarray(cells)
+        rows, cols = np.divmod(cells, self.n_cols)
+        return np.column_stack([self.south + (rows + 0.5) * self.step, self.west + (cols + 0.5) * self.step])
+
+    def _sources(self, locs):
+        """Snap points to cells and look up the per-km rates used for corrections."""
+        locs = np.asarray(locs, dtype=float).reshape(-1, 2)
+        cells = self.cells(locs)
+        rates = _minutes_per_km(locs) if len(locs) else np.empty(0)
+        # Many points share a cell, so centre estimates are computed once per distinct cell
+        unique_cells, inverse = np.unique(np.maximum(cells, 0), return_inverse=True)
+        return locs, cells, rates, self.cell_centres(unique_cells), inverse
+
+    def _minutes(self, sources, targets):
+        """Minutes from each prepared source to each target, shape (sources, targets)."""
+        locs, cells, rates, centres, inverse = sources
+        targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+        target_cells = self.cells(targets)
+        target_rates = _minutes_per_km(targets)
+        columns = np.where(target_cells >= 0, self._column_of_cell[np.maximum(target_cells, 0)], -1)
+        estimate = estimate_minutes(locs, targets, rates, target_rates)
+        source_rows, source_cols = np.divmod(cells, self.n_cols)
+        target_rows, target_cols = np.divmod(target_cells, self.n_cols)
+        near = ((np.abs(source_rows[:, None] - target_rows[None, :]) <= 1)
+                & (np.abs(source_cols[:, None] - target_cols[None, :]) <= 1))
+        routed = (cells[:, None] >= 0) & (columns[None, :] >= 0) & ~near
+        if not routed.any():
+            return estimate
+        base = self.minutes[np.maximum(columns, 0)][:, np.maximum(cells, 0)].T.astype(float)
+        centre_estimate = estimate_minutes(centres, self.cell_centres(np.maximum(target_cells, 0)))[inverse]
+        return np.where(routed, np.maximum(base + estimate - centre_estimate, 0), estimate)
+
+    def to_target(self, locs, target):
+        """Minutes from each point to one target point."""
+        return self._minutes(self._sources(locs), [target])[:, 0]
+
+    def min_to_targets(self, locs, targets, chunk_size=16):
+        """Minutes from each point to its nearest target point (inf if there are none)."""
+        locs = np.asarray(locs, dtype=float).reshape(-1, 2)
+        targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+        result = np.full(len(locs), float('inf'))
+        if len(locs) == 0:
+            return result
+        sources = self._sources(locs)
+        for start in range(0, len(targets), chunk_size):
+            np.minimum(result, self._minutes(sources, targets[start:start + chunk_size]).min(axis=1), out=result)
+        return result
+
+    @staticmethod
+    def effective_km(minutes):
+        """Express travel minutes as equivalent straight-line km on plain terrain."""
+        return np.asarray(minutes, dtype=float) * REFERENCE_SPEED_KMH / 60
+
+    def save(self, path):
+        """Write the matrix to a compressed .npz file."""
+        np.savez_compressed(path, bounds=np.array(self.bounds), step=np.array(self.step),
+                            target_cells=self.target_cells, minutes=self.minutes)
+
+    @classmethod
+    def load(cls, path):
+        """Load a matrix written by save()."""
+        with np.load(path) as data:
+            return cls(tuple(data['bounds']), float(data['step']), data['target_cells'], data['minutes'])
+
+def osrm_minutes(osrm_url, sources, targets, batch_size=200):
+    """Query an OSRM table service for minutes from sources to targets.
+
+    Pairs OSRM cannot route are left as NaN.
+    """
+    import requests
+    result = np.full((len(sources), len(targets)), np.nan)
+    target_part = ';'.join(f"{lon},{lat}" for lat, lon in targets)
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        source_part = ';'.join(f"{lon},{lat}" for lat, lon in batch)
+        response = requests.get(
+            f"{osrm_url.rstrip('/')}/table/v1/driving/{source_part};{target_part}",
+            params={
+                'sources': ';'.join(str(i) for i in range(len(batch))),
+                'destinations': ';'.join(str(len(batch) + i) for i in range(len(targets))),
+                'annotations': 'duration'
+            },
+            timeout=120
+        )
+        response.raise_for_status()
+        durations = response.json()['durations']
+        result[start:start + len(batch)] = np.array(durations, dtype=float) / 60
+    return result
+
+def build(hospitals, step=GRID_STEP, bounds=BOUNDS, osrm_url=None):
+    """Build travel times from every grid cell to the location and hospital cells."""
+    empty = TravelTimes(bounds, step, [], np.zeros((0, 0)))
+    points = np.vstack([_CENTROIDS, hospitals[['latitude', 'longitude']].to_numpy(dtype=float)])
+    target_cells = np.unique(empty.cells(points))
+    target_cells = target_cells[target_cells >= 0]
+    all_cells = np.arange(empty.n_rows * empty.n_cols)
+    sources = empty.cell_centres(all_cells)
+    targets = empty.cell_centres(target_cells)
+
+    minutes = estimate_minutes(sources, targets)
+    if osrm_url:
+        routed = osrm_minutes(osrm_url, sources, targets)
+        logging.info(f"OSRM routed {np.isfinite(routed).mean():.1%} of cell pairs")
+        minutes = np.where(np.isfinite(routed), routed, minutes)
+    return TravelTimes(bounds, step, target_cells, minutes.T)
+
+def main():
+    """Build the travel-time matrix used by the scorer."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--hospitals', default='hospitals.csv')
+    parser.add_argument('--step', type=float, default=GRID_STEP, help='grid cell size in degrees')
+    parser.add_argument('--osrm', default=None, help='OSRM base URL; without it times are estimated')
+    parser.add_argument('--output', default=TRAVEL_TIME_FILE)
+    args = parser.parse_args()
+
+    travel_times = build(pd.read_csv(args.hospitals), args.step, osrm_url=args.osrm)
+    travel_times.save(args.output)
+    print(f"Saved {travel_times.minutes.shape[0]} targets x {travel_times.minutes.shape[1]} cells to {args.output}")
+
+if __name__ == "__main__":
+    main()